@@ -0,0 +1,419 @@
+"""
+Headless agent: the chat loop, tool dispatch and per-conversation history,
+independent of Streamlit.
+
+`Agent.run_turn` runs one user turn and reports its progress as events;
+`Agent.stream` / `Agent.chat` expose the same turn to asyncio code such as
+server.py. Many conversations can run concurrently in one process, each
+in its own slot of the agent's thread pool.
+"""
+import os
+import asyncio
+import threading
+import contextvars
+import configparser
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+from toolbox import TOOLS, run_tool, run_tools, tool_declarations, get_gemini, get_vectordb, get_artifact_store
+from router import IntentRouter
+from history import HistoryManager
+from artifacts import current_session
+from resources import get_resource
+from tracing import tracer, span, record_usage, breakdown_markdown
+
+
+config = configparser.ConfigParser()
+config.read('config.INI')
+
+# Turns in flight at once, each holds a thread while it waits on Gemini
+agent_workers = config.getint('Agent', 'WORKERS', fallback=16)
+
+
+def init_vertex():
+    # Once per process, on the first model build rather than on every new session
+    def init():
+        import vertexai
+        load_dotenv()
+        vertexai.init(project=os.getenv('PROJECT_ID'), location=os.getenv('LOCATION'))
+        return True
+
+    return get_resource("vertexai", init)
+
+
+def get_bigquery_client():
+    # Not used by the agent itself, only created if something asks for it
+    def connect():
+        from google.cloud import bigquery
+        init_vertex()
+        return bigquery.Client(project=os.getenv('PROJECT_ID'))
+
+    return get_resource("bigquery", connect)
+
+
+def build_chat_model():
+    # The Vertex AI SDK is slow to import, it is only loaded once a model is built
+    from vertexai import generative_models
+    from vertexai.generative_models import (
+        FunctionDeclaration,
+        GenerativeModel,
+        GenerationConfig,
+        Tool,
+        SafetySetting
+    )
+
+    init_vertex()
+
+    # Functions declaration, generated by the tool registry in toolbox
+    query_tools = Tool(
+        function_declarations=[FunctionDeclaration(**declaration) for declaration in tool_declarations()],
+    )
+
+    return GenerativeModel(
+                                model_name="gemini-1.0-pro-002",
+
+                                system_instruction=["You are an AI Assistant developed for Arjtech. Your primary tasks are to write emails, retrieve information about company policies and assist in organizing meeting minutes using the provided tools."
+                                , "You will process spoken language descriptions to generate structured meeting summaries."
+                                , "Do not respond to questions outside these tasks.!"
+                                , "Please use the tools provided to give concise answers"
+                                , "DO NOT MAKEUP UP ANY ANSWERS IF NOT PROVIDED BY THE TOOLS!"],
+
+                                generation_config=GenerationConfig(temperature=0,
+                                                                    top_p=0.95,
+                                                                    top_k=10,
+                                                                    candidate_count=1,
+                                                                    max_output_tokens=8000,
+                                                                    stop_sequences=["STOP!"]
+                                ),
+                                safety_settings=[SafetySetting(
+                                                    category=generative_models.HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT,
+                                                    threshold=generative_models.HarmBlockThreshold.BLOCK_LOW_AND_ABOVE
+                                                ),
+                                                SafetySetting(
+                                                    category=generative_models.HarmCategory.HARM_CATEGORY_HATE_SPEECH,
+                                                    threshold=generative_models.HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE
+                                                ),
+                                                SafetySetting(
+                                                    category=generative_models.HarmCategory.HARM_CATEGORY_HARASSMENT,
+                                                    threshold=generative_models.HarmBlockThreshold.BLOCK_LOW_AND_ABOVE
+                                                ),
+                                                SafetySetting(
+                                                    category=generative_models.HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT,
+                                                    threshold=generative_models.HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE
+                                                ),
+                                ],
+                                tools=[query_tools]
+    )
+
+
+def get_function_call(part):
+    function_call = getattr(part, "function_call", None)
+    if function_call is not None and function_call.name:
+        return function_call
+    return None
+
+
+class Conversation:
+    """Everything kept per conversation: the full Gemini history, its
+    budgeted view and the transcript the UI renders."""
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.history = []
+        self.messages = []
+        self.history_manager = HistoryManager(summary_model=get_gemini())
+        # One turn at a time per conversation
+        self.lock = threading.Lock()
+
+
+class InMemorySessionStore:
+    """Default session store, conversations live in this process.
+
+    Any object with the same get / save / delete methods can be passed to
+    Agent instead, e.g. one backed by a shared database so that several
+    server workers can serve the same conversations.
+    """
+
+    def __init__(self):
+        self.conversations = {}
+        self.lock = threading.Lock()
+
+    def get(self, session_id):
+        with self.lock:
+            return self.conversations.get(session_id)
+
+    def save(self, conversation):
+        with self.lock:
+            self.conversations[conversation.session_id] = conversation
+
+    def delete(self, session_id):
+        with self.lock:
+            self.conversations.pop(session_id, None)
+
+
+class Agent:
+    """Employee assistant agent serving any number of conversations.
+
+    A turn emits events to its `on_event` callback as it goes:
+
+    - {"type": "model_start"}: a model reply starts streaming
+    - {"type": "text", "text"}: a chunk of the model reply
+    - {"type": "tool_calls", "calls"}: [(name, params)] the model (or the router) asked for
+    - {"type": "tool_text", "name", "text"}: a chunk of a streaming tool's output
+    - {"type": "tool_result", "name", "params", "result", "response", "streamed", "message"}
+    - {"type": "backend_details", "details"}: markdown summary of the tool calls so far
+    - {"type": "done", "message"} or {"type": "error", "error"}: always last
+
+    Requests the IntentRouter classifies confidently skip the chat model:
+    their tool runs directly and its output is the reply.
+    """
+
+    def __init__(self, model=None, session_store=None, max_workers=agent_workers, warm_up=True, router=None):
+        self._model = model
+        self.session_store = session_store if session_store is not None else InMemorySessionStore()
+        # Obvious requests go straight to their tool, pass router=False to always plan with the model
+        self.router = IntentRouter(TOOLS) if router is None else (router or None)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent")
+        self.lock = threading.Lock()
+
+        # Starts the handbook ingest in the background, construction itself stays cheap
+        if warm_up:
+            self.executor.submit(get_vectordb).add_done_callback(self.warmed_up)
+
+    @staticmethod
+    def warmed_up(future):
+        # Nobody waits on the warm-up, its failure would otherwise go unnoticed until the first query
+        if future.exception() is not None:
+            print(f"Error in Agent Warm Up :: {future.exception()}")
+
+    @property
+    def model(self):
+        if self._model is not None:
+            return self._model
+        return get_resource("chat-model", build_chat_model)
+
+    def conversation(self, session_id):
+
+        with self.lock:
+            conversation = self.session_store.get(session_id)
+            if conversation is None:
+                conversation = Conversation(session_id)
+                self.session_store.save(conversation)
+
+        return conversation
+
+    def reset(self, session_id):
+        self.session_store.delete(session_id)
+
+    def send_and_stream(self, chat, message, emit):
+        # Streams the model reply as text events; returns (function_calls, text).
+        # Every function call part of the turn is collected, their text is not emitted.
+        function_calls = []
+        text = ""
+        emit({"type": "model_start"})
+        with span("model.send_message", message_chars=len(str(message))) as model_call:
+            for chunk in chat.send_message(message, stream=True):
+                record_usage(model_call, chunk)
+                if "time_to_first_chunk_ms" not in model_call.attributes:
+                    model_call.set(time_to_first_chunk_ms=round(model_call.duration_ms, 1))
+                for part in chunk.candidates[0].content.parts:
+                    function_call = get_function_call(part)
+                    if function_call is not None:
+                        function_calls.append(function_call)
+                    elif not function_calls:
+                        text += part.text
+                        emit({"type": "text", "text": part.text})
+            model_call.set(function_calls=len(function_calls), response_chars=len(text))
+        return function_calls, text
+
+    @staticmethod
+    def tool_message(name, result):
+        # Transcript entries for the tools whose output the user keeps
+        if name == "create_mom":
+            return {"role": "assistant", "content": "notes", "notes": result,
+                    "artifact": get_artifact_store().locate("mom", result) if result else None}
+        if name == "write_an_email":
+            return {"role": "assistant", "content": "email", "email": result,
+                    "artifact": get_artifact_store().locate("email", result) if result else None}
+        return None
+
+    def run_turn(self, session_id, prompt, on_event=None):
+        """Runs one user turn to completion and returns its last event."""
+
+        emit = on_event if on_event is not None else (lambda event: None)
+        conversation = self.conversation(session_id)
+
+        with conversation.lock:
+            try:
+                # A fresh context per turn, the session id must not leak into the next turn on this thread
+                message = contextvars.copy_context().run(self.turn, conversation, prompt, emit)
+                event = {"type": "done", "message": message}
+            except Exception as e:
+                event = {"type": "error", "error": f"Error in Agent Turn :: {e}"}
+
+        emit(event)
+        return event
+
+    def turn(self, conversation, prompt, emit):
+
+        current_session.set(conversation.session_id)
+        conversation.messages.append({"role": "user", "content": prompt})
+
+        with span("turn", session_id=conversation.session_id, prompt_chars=len(prompt)) as turn_span:
+            route = self.route(prompt)
+            if route is not None:
+                turn_span.set(routed_to=route[0], route_reason=route[2])
+                full_response, backend_details = self.routed_turn(conversation, prompt, route, emit)
+            else:
+                full_response, backend_details = self.model_turn(conversation, prompt, emit)
+
+        # Per-turn timing breakdown of every model, tool, embedding and DB span
+        backend_details += f"- Turn latency: {turn_span.duration_ms:.0f} ms\n\n"
+        backend_details += breakdown_markdown(tracer.trace(turn_span.trace_id)) + "\n\n"
+
+        message = {"role": "assistant", "content": full_response, "backend_details": backend_details}
+        conversation.messages.append(message)
+        self.session_store.save(conversation)
+
+        return message
+
+    def route(self, prompt):
+        # The router only ever saves a call, when it fails the model plans the turn as usual
+        if self.router is None:
+            return None
+        try:
+            return self.router.route(prompt)
+        except Exception as e:
+            print(f"Error in Routing Request :: {e}")
+            return None
+
+    @staticmethod
+    def function_details(name, params, api_response):
+        details = "- Function call:\n"
+        details += f"   - Function name: ```{name}```\n\n"
+        details += f"   - Function parameters: ```{params}```\n\n"
+        details += f"   - Function API response: ```{api_response}```\n\n"
+        return details
+
+    def routed_turn(self, conversation, prompt, route, emit):
+        # Confidently classified request: the tool runs directly, without the planning call
+        # and without a second call to rephrase its output
+        name, params, reason = route
+        emit({"type": "tool_calls", "calls": [(name, params)]})
+
+        if name == "answer_query":
+            # The answer is the reply itself, it streams as model text
+            emit({"type": "model_start"})
+            on_text = lambda text: emit({"type": "text", "text": text})
+        else:
+            on_text = lambda text: emit({"type": "tool_text", "name": name, "text": text})
+
+        result, api_response = run_tool(name, params, on_text)
+
+        message = self.tool_message(name, result)
+        if message is not None:
+            conversation.messages.append(message)
+        emit({"type": "tool_result", "name": name, "params": params, "result": result,
+              "response": api_response, "streamed": True, "message": message})
+
+        full_response = result if name == "answer_query" and result else str(api_response)
+        if name != "answer_query" or not result:
+            emit({"type": "model_start"})
+            emit({"type": "text", "text": full_response})
+
+        backend_details = f"- Routed locally to ```{name}```: {reason}\n\n"
+        backend_details += self.function_details(name, params, api_response)
+        emit({"type": "backend_details", "details": backend_details})
+
+        # Later turns see the exchange like any other
+        from vertexai.generative_models import Content, Part
+        conversation.history = conversation.history + [
+            Content(role="user", parts=[Part.from_text(prompt)]),
+            Content(role="model", parts=[Part.from_text(full_response)]),
+        ]
+
+        return full_response, backend_details
+
+    def model_turn(self, conversation, prompt, emit):
+
+        # Only a budgeted view of the full history is resent with this turn
+        with span("history.compact", entries=len(conversation.history)) as compaction:
+            compacted_history = conversation.history_manager.compact(conversation.history)
+            prompt_size = conversation.history_manager.prompt_sizes[-1]
+            compaction.set(kept=len(compacted_history), tokens=prompt_size)
+        chat = self.model.start_chat(response_validation=True, history=compacted_history)
+
+        function_calls, full_response = self.send_and_stream(chat, prompt, emit)
+
+        backend_details = f"- Prompt history size: ~{prompt_size} tokens\n\n" # pylint: disable=invalid-name
+
+        while function_calls:
+            calls = [(function_call.name, dict(function_call.args.items())) for function_call in function_calls]
+            emit({"type": "tool_calls", "calls": calls})
+
+            # A single tool streams its own output; answer_query's answer is not shown, it goes
+            # back to the model as the function response and the model's reply is what streams
+            streamed = len(calls) == 1 and calls[0][0] != "answer_query"
+            if len(calls) == 1:
+                name, params = calls[0]
+                on_text = (lambda text: emit({"type": "tool_text", "name": name, "text": text})) if streamed else None
+                results = [run_tool(name, params, on_text)]
+            else:
+                results = run_tools(calls)
+
+            for (name, params), (result, api_response) in zip(calls, results):
+                message = self.tool_message(name, result)
+                if message is not None:
+                    conversation.messages.append(message)
+                emit({"type": "tool_result", "name": name, "params": params, "result": result,
+                      "response": api_response, "streamed": streamed, "message": message})
+
+                backend_details += self.function_details(name, params, api_response)
+
+            emit({"type": "backend_details", "details": backend_details})
+
+            # All results of the turn go back to the model in a single message
+            from vertexai.generative_models import Part
+            function_calls, full_response = self.send_and_stream(
+                chat,
+                [
+                    Part.from_function_response(
+                        name=name,
+                        response={
+                            "role": "assistant",
+                            "content": api_response,
+                        },
+                    )
+                    for (name, params), (result, api_response) in zip(calls, results)
+                ],
+                emit,
+            )
+
+        conversation.history = conversation.history + chat.history[len(compacted_history):]
+
+        return full_response, backend_details
+
+    async def stream(self, session_id, prompt):
+        """Async generator over the events of one turn, ending with "done" or "error"."""
+
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+
+        def emit(event):
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+
+        turn = loop.run_in_executor(self.executor, self.run_turn, session_id, prompt, emit)
+        while True:
+            event = await queue.get()
+            yield event
+            if event["type"] in ("done", "error"):
+                break
+
+        await turn
+
+    async def chat(self, session_id, prompt):
+        """Runs one turn and returns its last event."""
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.run_turn, session_id, prompt)
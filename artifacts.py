@@ -0,0 +1,135 @@
+import os
+import hashlib
+import textwrap
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import span
+
+
+# Set by the UI for every turn, tools running in a copied context see it too
+current_session = contextvars.ContextVar("current_session", default="default")
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792  # US Letter in points
+MARGIN = 72
+FONT_SIZE = 10
+LEADING = 14
+WRAP_CHARS = 95
+
+
+def pdf_escape(line):
+    # The standard Helvetica font is declared with WinAnsiEncoding (cp1252), anything outside it becomes "?"
+    line = line.encode("cp1252", "replace").decode("cp1252")
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def render_pdf(text, title=None):
+    """Plain text laid out on Letter pages as a minimal, dependency-free PDF."""
+
+    lines = [title, ""] if title else []
+    for paragraph in text.replace("\r", "").split("\n"):
+        lines.extend(textwrap.wrap(paragraph, WRAP_CHARS) or [""])
+
+    per_page = (PAGE_HEIGHT - 2 * MARGIN) // LEADING
+    pages = [lines[i:i + per_page] for i in range(0, len(lines), per_page)] or [[]]
+
+    # 1: catalog, 2: page tree, 3: font, then a page and a content stream per page
+    objects = [None, None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    page_ids = []
+    for page in pages:
+        commands = [f"BT /F1 {FONT_SIZE} Tf {LEADING} TL {MARGIN} {PAGE_HEIGHT - MARGIN} Td"]
+        commands += [f"({pdf_escape(line)}) '" for line in page]
+        commands.append("ET")
+        stream = "\n".join(commands).encode("cp1252")
+
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R "
+                       b"/Resources << /Font << /F1 3 0 R >> >> >>" % (PAGE_WIDTH, PAGE_HEIGHT, len(objects)))
+        page_ids.append(len(objects))
+
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % page_id for page_id in page_ids), len(page_ids))
+
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return pdf
+
+
+class ArtifactStore:
+    """Generated minutes and emails, rendered to PDF off the request path.
+
+    Every artifact is stored under `root/<session>/<kind>-<hash>.pdf`, the
+    hash being that of its text, so sessions never write to each other's
+    files and the UI can find an artifact again from its text alone.
+    Rendering and writing happen on a single background writer thread.
+    """
+
+    TITLES = {"mom": "Minutes of Meeting", "email": "Email"}
+
+    def __init__(self, root="artifacts"):
+        self.root = os.path.abspath(root)
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="artifact-writer")
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def safe_name(session_id):
+        return "".join(c for c in str(session_id) if c.isalnum() or c in "-_") or "default"
+
+    def locate(self, kind, text, session_id=None):
+
+        session_id = self.safe_name(session_id if session_id is not None else current_session.get())
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+        name = f"{kind}-{digest}.pdf"
+        return {"id": digest, "kind": kind, "name": name, "path": os.path.join(self.root, session_id, name)}
+
+    def save(self, kind, text, session_id=None):
+        """Queues the artifact for rendering and returns it straight away."""
+
+        artifact = self.locate(kind, text, session_id)
+        with self.lock:
+            if artifact["path"] not in self.pending and not os.path.exists(artifact["path"]):
+                self.pending[artifact["path"]] = self.writer.submit(
+                    contextvars.copy_context().run, self.write, artifact, text)
+
+        return artifact
+
+    def write(self, artifact, text):
+
+        try:
+            with span("artifact.write", kind=artifact["kind"], chars=len(text)):
+                pdf = render_pdf(text, self.TITLES.get(artifact["kind"]))
+                os.makedirs(os.path.dirname(artifact["path"]), exist_ok=True)
+                tmp_path = artifact["path"] + ".tmp"
+                with open(tmp_path, "wb") as file:
+                    file.write(pdf)
+                os.replace(tmp_path, artifact["path"])
+        except Exception as e:
+            print(f"Error in Writing Artifact {artifact['name']} :: {e}")
+        finally:
+            with self.lock:
+                self.pending.pop(artifact["path"], None)
+
+    def ready(self, artifact):
+        return os.path.exists(artifact["path"])
+
+    def read(self, artifact):
+        with open(artifact["path"], "rb") as file:
+            return file.read()
+
+    def flush(self):
+        # Waits for every queued write, e.g. before a benchmark reports
+        with self.lock:
+            pending = list(self.pending.values())
+        for future in pending:
+            future.result()
@@ -0,0 +1,425 @@
+"""
+Offline retrieval / answer benchmark.
+
+Drives ingestion, retrieval and the tools against deterministic local
+stand-ins for Gemini (embeddings and generation) and MyScale, and writes
+ingest throughput, retrieval latency percentiles, recall@k, per-tool and
+end-to-end agent turn latency and cold-start import times as JSON so runs
+can be compared across commits:
+
+    python benchmark.py --output benchmark_results.json
+"""
+import os
+import sys
+import json
+import importlib.util
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+from types import SimpleNamespace
+
+from embedder import Embedder, FakeEmbeddingBackend
+from cache import QueryCache
+from store import LocalVectorStore
+from resources import pool
+from response_cache import ResponseCache
+from artifacts import ArtifactStore
+
+
+SOURCE_PATH = "Arjtech Private Ltd. Company Policy Document.pdf"
+QUESTIONS_PATH = "benchmark_questions.json"
+# (request, tool the router should send it to, None when it must be left to the chat model)
+ROUTER_CASES = [
+    ("Draft an email to the manager asking for 2 days wfh in october?", "write_an_email"),
+    ("Send an email to the HR department asking for details about the benefits package.", "write_an_email"),
+    ("Write an email to HR asking for details about the health insurance plan?", "write_an_email"),
+    ("Can you summarize the company leave policy?", "answer_query"),
+    ("What are the main rules in our employee dress code?", "answer_query"),
+    ("Please take the following meeting description and generate organized meeting minutes: Alice shared "
+     "the design updates and Bob will hire two developers by Friday.", "create_mom"),
+    ("Write the minutes of this meeting and email them to HR", None),
+    # A policy question next to an email request is two requests
+    ("Draft an email to HR and tell me the leave policy", None),
+    ("Write an email to my manager and also what is the dress code?", None),
+    ("What is the leave policy? Email HR my leave dates", None),
+    ("Make it shorter", None),
+    ("Hello, who are you?", None),
+    # Off-topic questions are for the chat model to decline
+    ("What is the capital of France?", None),
+    ("Who won the 2022 world cup?", None),
+    ("Can you write me a python script?", None),
+]
+RECIPIENT_CASES = [
+    ("asking HR for two days of leave", "hr@arjtech.com"),
+    ("the three day offsite budget", "xyz@arjtech.com"),
+    ("to my manager about the human resources survey", "manager@arjtech.com"),
+]
+
+# Modules a new worker imports before it can serve; the Vertex AI SDK is only
+# imported with the first chat model, so it is not counted here
+STARTUP_MODULES = ["toolbox", "agent"]
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """Deterministic stand-in for genai.GenerativeModel.
+
+    Replies echo the tail of the prompt after `latency` seconds, streamed in
+    `chunk_size` character chunks when stream=True.
+    """
+
+    def __init__(self, latency=0.0, chunk_size=40):
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.requests = 0
+        self.prompt_chars = []
+        self.lock = threading.Lock()
+
+    def reply(self, prompt):
+        with self.lock:
+            self.requests += 1
+            self.prompt_chars.append(len(prompt))
+        return "FAKE REPLY :: " + " ".join(prompt.split()[-60:])
+
+    def stream(self, text):
+        for i in range(0, len(text), self.chunk_size):
+            time.sleep(self.latency / max(len(text) // self.chunk_size, 1))
+            yield FakeResponse(text[i:i + self.chunk_size])
+
+    def generate_content(self, prompt, stream=False):
+
+        text = self.reply(prompt)
+        if stream:
+            return self.stream(text)
+
+        time.sleep(self.latency)
+        return FakeResponse(text)
+
+
+class FakeChatSession:
+    """Chat session of FakeChatModel: a prompt is answered with an answer_query
+    call, a function response with a short text reply, both as streamed chunks."""
+
+    def __init__(self, model, history):
+        self.model = model
+        self.history = list(history)
+
+    @staticmethod
+    def chunk(part):
+        return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))],
+                               usage_metadata=None)
+
+    def send_message(self, message, stream=True):
+
+        with self.model.lock:
+            self.model.requests += 1
+        time.sleep(self.model.latency)
+
+        if isinstance(message, str):
+            call = SimpleNamespace(name="answer_query", args={"query": message})
+            parts = [SimpleNamespace(function_call=call, text="")]
+        else:
+            parts = [SimpleNamespace(function_call=None, text=text) for text in ["Per the handbook, ", "see above."]]
+
+        for part in parts:
+            yield self.chunk(part)
+
+        text = "".join(part.text for part in parts)
+        self.history += [SimpleNamespace(role="user", parts=[SimpleNamespace(text=str(message))]),
+                         SimpleNamespace(role="model", parts=[SimpleNamespace(text=text)])]
+
+
+class FakeChatModel:
+    """Deterministic stand-in for the Vertex AI chat model, `latency` seconds per message."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def start_chat(self, response_validation=True, history=()):
+        return FakeChatSession(self, history)
+
+
+def percentile(values, q):
+
+    values = sorted(values)
+    if not values:
+        return None
+
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def latency_summary(latencies):
+    # Seconds in, milliseconds out
+    return {
+        "count": len(latencies),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": max(latencies) * 1000,
+    }
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def parse_importtime(stderr):
+    # "import time: self [us] | cumulative | imported package", nesting shown by indentation
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), depth, int(cumulative)))
+    return rows
+
+
+def bench_startup(args):
+
+    results = {}
+    for module in STARTUP_MODULES:
+        # A fresh interpreter per module, so nothing is already imported
+        process, wall = timed(subprocess.run, [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                              capture_output=True, text=True)
+        if process.returncode != 0:
+            results[module] = {"error": process.stderr.strip().splitlines()[-1]}
+            continue
+
+        rows = parse_importtime(process.stderr)
+        # Children are printed before their parent, the module's direct imports precede its own row
+        end = max(i for i, (name, depth, _) in enumerate(rows) if name == module and depth == 0)
+        start = max((i for i, (_, depth, _) in enumerate(rows[:end]) if depth == 0), default=-1) + 1
+        direct = sorted((row for row in rows[start:end] if row[1] == 1), key=lambda row: row[2], reverse=True)
+        results[module] = {
+            "wall_seconds": wall,
+            "import_ms": rows[end][2] / 1000,
+            "within_budget": wall <= args.startup_budget,
+            "slowest_imports_ms": {name: cumulative / 1000 for name, _, cumulative in direct[:10]},
+        }
+
+    return results
+
+
+def make_vectordb(args, workdir, query_cache=None):
+    from db import VectorDB
+
+    embedder = Embedder(backend=FakeEmbeddingBackend(latency=args.embed_latency),
+                        batch_size=args.batch_size, max_workers=args.workers)
+
+    stores = {}
+
+    def store_factory(version):
+        if version not in stores:
+            stores[version] = LocalVectorStore(path=os.path.join(workdir, "store", f"v{version}"))
+        return stores[version]
+
+    return VectorDB(source_paths=args.source,
+                    manifest_path=os.path.join(workdir, "manifest.json"),
+                    embedder=embedder,
+                    query_cache=query_cache if query_cache is not None else QueryCache(maxsize=0),
+                    store_factory=store_factory,
+                    store_release=lambda version: stores.pop(version, None),
+                    keyword_index_path=os.path.join(workdir, "bm25.json"))
+
+
+def bench_ingest(args, workdir):
+
+    vectordb = make_vectordb(args, workdir)
+    status, cold = timed(vectordb.create_and_update_vectordb)
+    chunks = len(vectordb.load_manifest()["chunks"])
+    requests = vectordb.embedder.backend.requests
+
+    # A second run over the unchanged source must return straight away
+    warm_status, warm = timed(make_vectordb(args, workdir).create_and_update_vectordb)
+
+    return {
+        "status": status,
+        "chunks": chunks,
+        "embedding_requests": requests,
+        "cold_seconds": cold,
+        "chunks_per_second": chunks / cold if cold else None,
+        "warm_status": warm_status,
+        "warm_ms": warm * 1000,
+    }
+
+
+def bench_retrieval(args, workdir, questions):
+
+    results = {}
+    for mode in ["vector", "hybrid"]:
+        vectordb = make_vectordb(args, workdir)
+
+        latencies = []
+        hits = {k: 0 for k in args.k}
+        for item in questions:
+            rows, latency = timed(vectordb.get_relevant_docs, item["question"], k=max(args.k),
+                                  with_metadata=True, mode=mode)
+            latencies.append(latency)
+            sections = [row["section"] for row in rows]
+            for k in args.k:
+                hits[k] += item["section"] in sections[:k]
+
+        # One round trip for the whole question set
+        _, batch_latency = timed(vectordb.get_relevant_docs_batch, [item["question"] for item in questions],
+                                 k=max(args.k), mode=mode)
+
+        results[mode] = {
+            "latency": latency_summary(latencies),
+            "batch_seconds": batch_latency,
+            "recall": {f"@{k}": hits[k] / len(questions) for k in args.k},
+        }
+
+    # Repeat queries served from the query cache
+    vectordb = make_vectordb(args, workdir, query_cache=QueryCache())
+    for item in questions:
+        vectordb.get_relevant_docs(item["question"])
+    latencies = [timed(vectordb.get_relevant_docs, item["question"])[1] for item in questions]
+    results["cached"] = {"latency": latency_summary(latencies), "cache": vectordb.query_cache.stats()}
+
+    return results
+
+
+def bench_tools(args, workdir, questions):
+
+    # Register the stand-ins before toolbox is imported, it picks them up from the pool
+    model = FakeGenerativeModel(latency=args.llm_latency)
+    pool.put("gemini-pro", model)
+    pool.put("vectordb", make_vectordb(args, workdir))
+    pool.put("response_cache", ResponseCache(path=os.path.join(workdir, "responses.sqlite3")))
+    pool.put("artifacts", ArtifactStore(root=os.path.join(workdir, "artifacts")))
+
+    import toolbox
+
+    cases = {
+        "answer_query": [{"query": item["question"]} for item in questions],
+        "write_an_email": [{"about": "asking HR for two days of leave next week"}] * args.repeat,
+        "create_mom": [{"description": "Alice shared design updates, Bob will hire two developers by Friday."}] * args.repeat,
+    }
+
+    results = {}
+    for name, calls in cases.items():
+        seen = len(model.prompt_chars)
+        latencies = [timed(toolbox.run_tool, name, params)[1] for params in calls]
+        results[name] = latency_summary(latencies)
+        # Prompt size of the generations that actually reached the model (cache misses)
+        prompt_chars = model.prompt_chars[seen:]
+        if prompt_chars:
+            results[name]["mean_prompt_tokens"] = sum(prompt_chars) / len(prompt_chars) / 4
+
+    # PDFs are rendered off the request path, timed separately
+    _, results["artifact_flush_seconds"] = timed(toolbox.get_artifact_store().flush)
+    results["stats"] = toolbox.tool_stats()
+
+    # Local routing: which requests skip the planning call, and whether they land on the right tool
+    from router import IntentRouter
+    router = IntentRouter(toolbox.TOOLS, embedder=toolbox.get_vectordb().embedder)
+    cases = ROUTER_CASES + [(item["question"], "answer_query") for item in questions]
+    routes, latencies = zip(*(timed(router.route, prompt) for prompt, _ in cases))
+    decisions = [route[0] if route is not None else None for route in routes]
+    results["router"] = {
+        "latency": latency_summary(latencies),
+        "routed": sum(decision is not None for decision in decisions) / len(cases),
+        "wrong_tool": sum(decision is not None and decision != expected
+                          for decision, (_, expected) in zip(decisions, cases)),
+        "recipients_correct": sum(toolbox.find_receiver(text) == email for text, email in RECIPIENT_CASES)
+                              / len(RECIPIENT_CASES),
+    }
+    results["response_cache"] = toolbox.get_response_cache().stats()
+    return results
+
+
+def bench_turns(args, questions):
+    # Whole agent turns, planned by a fake chat model or routed locally; runs after
+    # bench_tools, whose stand-ins are still in the pool
+    # Turns still build Vertex AI history contents, even with the fake chat model
+    if "vertexai" not in sys.modules and importlib.util.find_spec("vertexai") is None:
+        return {"error": "agent turns need the Vertex AI SDK"}
+
+    from agent import Agent
+
+    import toolbox
+    pool.put("embedder", toolbox.get_vectordb().embedder)
+
+    results = {}
+    for mode, router in [("planned", False), ("routed", None)]:
+        # A fresh response cache per mode, so neither one is served the other's generations
+        pool.put("response_cache", ResponseCache(path=None))
+        chat_model = FakeChatModel(latency=args.llm_latency)
+        agent = Agent(model=chat_model, warm_up=False, router=router)
+
+        events = [timed(agent.run_turn, f"{mode}-{i}", item["question"]) for i, item in enumerate(questions)]
+        results[mode] = {
+            "latency": latency_summary([latency for _, latency in events]),
+            "errors": sum(event["type"] != "done" for event, _ in events),
+            "chat_model_calls_per_turn": chat_model.requests / len(questions),
+        }
+
+        # The same turns all at once, each in its own conversation
+        pool.put("response_cache", ResponseCache(path=None))
+        _, wall = timed(lambda: list(agent.executor.map(
+            lambda item: agent.run_turn(f"{mode}-concurrent-{item[0]}", item[1]["question"]), enumerate(questions))))
+        results[mode]["concurrent_turns_per_second"] = len(questions) / wall
+        agent.executor.shutdown()
+
+    return results
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", nargs="+", default=[SOURCE_PATH])
+    parser.add_argument("--questions", default=QUESTIONS_PATH)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="seconds per fake embedding request")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds per fake generation request")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--startup-budget", type=float, default=2.0, help="seconds allowed for a cold import")
+    args = parser.parse_args()
+
+    with open(args.questions) as file:
+        questions = json.load(file)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results = {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "config": vars(args),
+            "startup": bench_startup(args),
+            "ingest": bench_ingest(args, workdir),
+            "retrieval": bench_retrieval(args, workdir, questions),
+            "tools": bench_tools(args, workdir, questions),
+            "turns": bench_turns(args, questions),
+        }
+
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import os
+import re
+import json
+import math
+import unicodedata
+from collections import Counter, defaultdict
+
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how",
+    "i", "in", "is", "it", "me", "my", "of", "on", "or", "our", "the", "to", "we", "what",
+    "when", "which", "who", "with", "you", "your", "about", "tell", "please", "policy",
+}
+
+
+def tokenize(text):
+    text = unicodedata.normalize("NFKC", text).lower()
+    return [token for token in re.findall(r"\w+", text) if token not in STOPWORDS]
+
+
+class KeywordIndex:
+    """Inverted index over the handbook chunks, scored with Okapi BM25.
+
+    Rows are the same dicts the vector store returns (id, page_content, page,
+    section, offsets), so keyword and vector hits can be fused by id. The
+    index is kept in step with the store by the ingestion and persisted as
+    JSON at `path`.
+    """
+
+    def __init__(self, path=None, k1=1.5, b=0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+
+        self.rows = {}
+        self.lengths = {}
+        self.postings = defaultdict(dict)
+
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def clear(self):
+        self.rows = {}
+        self.lengths = {}
+        self.postings = defaultdict(dict)
+
+    def add(self, rows):
+
+        for row in rows:
+            doc_id = row['id']
+            terms = Counter(tokenize(row['page_content']))
+            self.rows[doc_id] = row
+            self.lengths[doc_id] = sum(terms.values())
+            for term, tf in terms.items():
+                self.postings[term][doc_id] = tf
+
+    def search(self, query, k=3, filters=None):
+        """Return [(score, row)] of the k best matching rows, best first."""
+
+        if not self.rows:
+            return []
+
+        num_docs = len(self.rows)
+        avg_length = sum(self.lengths.values()) / num_docs
+
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (num_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / avg_length)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        if filters:
+            scores = {doc_id: score for doc_id, score in scores.items()
+                      if all(self.rows[doc_id].get(column) == value for column, value in filters.items())}
+
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(score, self.rows[doc_id]) for doc_id, score in best]
+
+    def covers(self, query, row):
+        # True when every query term occurs in the row
+        terms = set(tokenize(query))
+        return bool(terms) and all(row['id'] in self.postings.get(term, {}) for term in terms)
+
+    def load(self):
+
+        with open(self.path) as file:
+            data = json.load(file)
+
+        self.rows = {row['id']: row for row in data["rows"]}
+        self.lengths = {int(doc_id): length for doc_id, length in data["lengths"].items()}
+        self.postings = defaultdict(dict, {
+            term: {int(doc_id): tf for doc_id, tf in postings.items()} for term, postings in data["postings"].items()
+        })
+
+    def save(self):
+
+        if self.path is None:
+            return
+
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump({"rows": list(self.rows.values()), "lengths": self.lengths, "postings": self.postings}, file)
+        os.replace(tmp_path, self.path)
+
+
+def reciprocal_rank_fusion(rankings, k, rrf_k=60):
+    """Fuse ranked lists of rows by id, score(d) = sum 1 / (rrf_k + rank)."""
+
+    scores = defaultdict(float)
+    rows = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, start=1):
+            scores[row['id']] += 1.0 / (rrf_k + rank)
+            rows.setdefault(row['id'], row)
+
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [rows[doc_id] for doc_id in best]
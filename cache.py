@@ -0,0 +1,120 @@
+import re
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_query(text):
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return " ".join(text.split())
+
+
+class QueryCache:
+    """Two-tier LRU+TTL cache for query embeddings and their top-k documents.
+
+    The exact tier is keyed on the normalized query text and skips both the
+    embedding call and the DB query. The optional semantic tier reuses the
+    documents of a cached query whose embedding is within
+    `semantic_threshold` cosine similarity, skipping the DB query.
+    `scope` holds the retrieval parameters (k, filters) that are part of the key.
+    Entries are tagged with the handbook version they were computed against,
+    and the whole cache is dropped as soon as a different version is seen.
+    `misses` counts the lookups the exact tier could not serve, of which
+    `semantic_hits` were then answered by the semantic tier.
+    """
+
+    def __init__(self, maxsize=512, ttl=3600, semantic_threshold=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.semantic_threshold = semantic_threshold
+
+        self.entries = OrderedDict()
+        self.version = None
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def _check_version(self, version):
+        if version != self.version:
+            self.entries.clear()
+            self.version = version
+
+    def _expired(self, entry):
+        return self.ttl is not None and time.monotonic() - entry["created"] > self.ttl
+
+    def get(self, query, version=None, scope=None):
+        """Return (embedding, docs) for an exact match of `query`, or None."""
+
+        key = (normalize_query(query), scope)
+        with self.lock:
+            self._check_version(version)
+            entry = self.entries.get(key)
+            if entry is not None and self._expired(entry):
+                del self.entries[key]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry["embedding"], entry["docs"]
+
+    def get_similar(self, embedding, version=None, scope=None):
+        """Return docs of the most similar cached query above the threshold, or None."""
+
+        with self.lock:
+            self._check_version(version)
+            keys = [key for key in self.entries if key[1] == scope]
+            if self.semantic_threshold is None or not keys:
+                return None
+
+            matrix = np.stack([self.entries[key]["unit"] for key in keys])
+            query = np.asarray(embedding, dtype=np.float32)
+            query = query / (np.linalg.norm(query) or 1.0)
+
+            scores = matrix @ query
+            best = int(np.argmax(scores))
+            entry = self.entries[keys[best]]
+
+            if scores[best] < self.semantic_threshold or self._expired(entry):
+                return None
+
+            self.entries.move_to_end(keys[best])
+            self.semantic_hits += 1
+            return entry["docs"]
+
+    def put(self, query, embedding, docs, version=None, scope=None):
+
+        key = (normalize_query(query), scope)
+        vector = np.asarray(embedding, dtype=np.float32)
+
+        with self.lock:
+            self._check_version(version)
+            self.entries[key] = {
+                "embedding": embedding,
+                "unit": vector / (np.linalg.norm(vector) or 1.0),
+                "docs": docs,
+                "created": time.monotonic(),
+            }
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "size": len(self.entries),
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,84 @@
+import re
+
+from tracing import span
+
+
+def estimate_tokens(text):
+    # Roughly four characters per token for English text
+    return len(text) // 4 + 1
+
+
+def merge_rows(rows):
+    """Merge retrieved chunks that overlap or touch in their source document.
+
+    Offsets are positions in the newline-joined text of the source, so two
+    chunks of the same source overlap when one starts before the other
+    ends; the merged text is stitched from both without repeating the
+    overlap. Passages keep the rank of their best chunk and the page and
+    section of their earliest one.
+    """
+
+    passages = []
+    by_source = {}
+    for rank, row in enumerate(rows):
+        by_source.setdefault(row.get('source'), []).append((rank, row))
+
+    for source, ranked in by_source.items():
+        ranked.sort(key=lambda item: item[1]['start_offset'])
+        current = None
+        for rank, row in ranked:
+            # A gap of one character is the newline between two pages
+            if current is not None and row['start_offset'] <= current['end_offset'] + 1:
+                if row['end_offset'] > current['end_offset']:
+                    tail = row['page_content'][max(current['end_offset'] - row['start_offset'], 0):]
+                    separator = "\n" if row['start_offset'] > current['end_offset'] else ""
+                    current['page_content'] += separator + tail
+                    current['end_offset'] = row['end_offset']
+                current['rank'] = min(current['rank'], rank)
+                current['ids'].append(row['id'])
+                continue
+
+            current = {key: row.get(key) for key in ('source', 'page', 'section', 'start_offset', 'end_offset')}
+            current.update(page_content=row['page_content'], rank=rank, ids=[row['id']])
+            passages.append(current)
+
+    return sorted(passages, key=lambda passage: passage['rank'])
+
+
+def dedupe(passages):
+    # The same text can come from different sources or sections, keep its best ranked copy
+    seen = set()
+    unique = []
+    for passage in passages:
+        key = " ".join(re.findall(r"\w+", passage['page_content'].lower()))
+        if key and key not in seen:
+            seen.add(key)
+            unique.append(passage)
+    return unique
+
+
+def assemble_context(rows, token_budget=1000):
+    """Passages for a RAG prompt: rows (in relevance order, with offsets) are
+    merged, deduplicated and packed in relevance order until `token_budget`
+    estimated tokens are used. A passage that does not fit is skipped for
+    smaller ones further down; the best one is truncated rather than dropped.
+    """
+
+    with span("context.assemble", rows=len(rows), token_budget=token_budget) as assemble:
+        passages = dedupe(merge_rows(rows))
+
+        packed = []
+        used = 0
+        for passage in passages:
+            tokens = estimate_tokens(passage['page_content'])
+            if used + tokens > token_budget:
+                if packed:
+                    continue
+                passage['page_content'] = passage['page_content'][:token_budget * 4]
+                tokens = estimate_tokens(passage['page_content'])
+            packed.append(passage)
+            used += tokens
+
+        assemble.set(passages=len(packed), tokens=used)
+
+    return packed
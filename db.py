@@ -1,11 +1,19 @@
 import os
-import clickhouse_connect
-
-import pandas as pd
-import google.generativeai as genai
-
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+import re
+import json
+import time
+import unicodedata
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from embedder import Embedder
+from cache import QueryCache
+from store import MyScaleStore, LocalVectorStore, COLUMNS
+from resources import get_resource, pool
+from bm25 import KeywordIndex, reciprocal_rank_fusion
+from tracing import span
 
 import configparser
 
@@ -14,117 +22,547 @@ config = configparser.ConfigParser()
 config.read('config.INI')
 
 # Accessing configuration values
-api_key = config.get('General', 'GEMINI_API_KEY')
-username = config.get('General', 'DB_USERNAME')
-password = config.get('General', 'DB_PASSWORD')
-
-genai.configure(api_key=api_key)
+username = config.get('General', 'DB_USERNAME', fallback=None)
+password = config.get('General', 'DB_PASSWORD', fallback=None)
+
+store_backend = config.get('VectorStore', 'BACKEND', fallback='myscale')
+store_path = config.get('VectorStore', 'PATH', fallback='handbook_store')
+store_mmap = config.getboolean('VectorStore', 'MMAP', fallback=False)
+# Seconds a new version's vector index may take to build before the build fails
+index_timeout = config.getfloat('VectorStore', 'INDEX_TIMEOUT', fallback=600)
+
+cache_size = config.getint('Cache', 'QUERY_CACHE_SIZE', fallback=512)
+cache_ttl = config.getint('Cache', 'QUERY_CACHE_TTL', fallback=3600)
+semantic_threshold = config.getfloat('Cache', 'SEMANTIC_THRESHOLD', fallback=None)
+
+retrieval_mode = config.get('Retrieval', 'MODE', fallback='hybrid')
+bm25_path = config.get('Retrieval', 'BM25_PATH', fallback='handbook_bm25.json')
+rrf_k = config.getint('Retrieval', 'RRF_K', fallback=60)
+keyword_only_margin = config.getfloat('Retrieval', 'KEYWORD_ONLY_MARGIN', fallback=1.5)
+
+SOURCE_PATH = "req/Arjtech Private Ltd. Company Policy Document.pdf"
+# One PDF per line (or comma separated), every one is chunked into the same handbook index
+handbook_sources = [path.strip() for path in re.split(r"[\n,]", config.get('Ingestion', 'SOURCES', fallback=SOURCE_PATH))
+                if path.strip()]
+# Built versions kept around after a swap, older ones are dropped
+keep_versions = config.getint('Ingestion', 'KEEP_VERSIONS', fallback=2)
+# Chunks embedded and inserted per round trip, bounds ingest memory whatever the corpus size
+insert_batch_size = config.getint('Ingestion', 'INSERT_BATCH_SIZE', fallback=400)
+# A failed first build is retried by the next query once this many seconds have passed
+ingest_retry_interval = config.getfloat('Ingestion', 'RETRY_INTERVAL', fallback=60)
+
+MANIFEST_PATH = "handbook_manifest.json"
+# Bumped whenever the stored columns change, an older manifest forces a fresh build
+SCHEMA_VERSION = 3
+
+# Numbered section headings such as "3. Leave Policy" or "5.2 Acceptable Attire"
+HEADING_PATTERN = re.compile(r"^\s*\d+(?:\.\d+)*\.?\s+([A-Z][^.:;●]{1,80}?)\s*$")
+
+# Background builds run one at a time, off the request path
+ingest_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest")
+
+def make_store(version, backend=store_backend):
+    # Every handbook version lives in its own table / directory
+    if backend == 'local':
+        return LocalVectorStore(path=os.path.join(store_path, f"v{version}"), mmap=store_mmap)
+
+    if backend == 'myscale':
+        return MyScaleStore(username=username, password=password, table=f"default.handbook_v{version}",
+                            index_timeout=index_timeout)
+
+    raise ValueError(f"Unknown vector store backend :: {backend}")
+
+def shared_store(version):
+    return get_resource(f"vector_store:{store_backend}:v{version}", lambda: make_store(version),
+                        health_check=lambda store: store.ping())
+
+def release_store(version):
+    pool.discard(f"vector_store:{store_backend}:v{version}")
 
 class VectorDB:
-    def __init__(self):
-        self.loader = PyPDFLoader("req/Arjtech Private Ltd. Company Policy Document.pdf")
-
-        self.dbclient = clickhouse_connect.get_client(
-            host='myscaledb',
-            port='port',
-            username= username,
-            password= password
-            )
+    """Versioned handbook index.
+
+    Each ingest builds a complete new version (store with its vector index
+    plus keyword index) next to the active one, then swaps the `version`
+    pointer in the manifest. Queries keep reading the active version until
+    the swap, and pick up a version activated by another process on their
+    next call. `store_factory(version)` must hand back the same store for
+    repeated calls, by default from the process-wide resource pool.
+    """
+
+    def __init__(self, source_paths=None, manifest_path=MANIFEST_PATH, embedder=None, query_cache=None,
+                 store_factory=None, store_release=None, keyword_index_path=bm25_path):
+        self.source_paths = list(source_paths or handbook_sources)
+        self.manifest_path = manifest_path
+        self.keyword_index_path = keyword_index_path
+
+        # Without explicit ones, the DB clients and the embedding client are shared process-wide
+        self.store_factory = store_factory if store_factory is not None else shared_store
+        self.store_release = store_release if store_release is not None else release_store
+        self.embedder = embedder if embedder is not None else get_resource("embedder", Embedder)
+        self.query_cache = query_cache if query_cache is not None else QueryCache(
+            maxsize=cache_size, ttl=cache_ttl, semantic_threshold=semantic_threshold)
+
+        self.build_lock = threading.Lock()
+        self.pending = None
+        self.pending_lock = threading.Lock()
+        self.failed_at = None
+        self.manifest_mtime = None
+        self.active_version = None
+        self.keyword_index = KeywordIndex()
+        # Cached retrievals are only valid for the handbook version they were computed on
+        self.handbook_version = None
+        self.refresh()
+
+    @property
+    def store(self):
+        return self.store_factory(self.active_version)
+
+    def keyword_index_for(self, version):
+        if self.keyword_index_path is None:
+            return KeywordIndex()
+        root, ext = os.path.splitext(self.keyword_index_path)
+        return KeywordIndex(path=f"{root}_v{version}{ext}")
+
+    def activate(self, manifest, keyword_index=None):
+        # The index is swapped before the version, so a query never pairs a new store with an old index
+        self.keyword_index = keyword_index if keyword_index is not None else self.keyword_index_for(manifest["version"])
+        self.active_version = manifest["version"]
+        self.handbook_version = manifest["source_hash"]
+
+    def refresh(self):
+        # Cheap stat on every query, the manifest is only re-read after a swap
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+
+        if mtime == self.manifest_mtime:
+            return
+
+        manifest = self.load_manifest()
+        self.manifest_mtime = mtime
+        if manifest["version"] is not None and manifest["version"] != self.active_version:
+            self.activate(manifest)
+
+    def start_background_ingest(self):
+        """Builds the next version on the ingest thread and returns its future."""
+
+        self.pending = ingest_executor.submit(self.ingest)
+        return self.pending
+
+    def ingest(self):
+        # Nothing waits on the background build, its status is logged here
+        status = self.create_and_update_vectordb()
+        self.failed_at = time.monotonic() if status.startswith("Error") else None
+        print(status)
+        return status
+
+    def retry_failed_ingest(self):
+        # Without any version to serve, a failed background build is started again
+        with self.pending_lock:
+            if self.pending is None or not self.pending.done() or self.failed_at is None:
+                return
+            if time.monotonic() - self.failed_at >= ingest_retry_interval:
+                self.start_background_ingest()
+
+    def wait_for_ingest(self, timeout=None):
+        if self.pending is not None:
+            return self.pending.result(timeout)
+
+    def get_embeddings(self, text):
+        return self.embedder.embed([text])[0]
 
-        self.pages = None
+    @staticmethod
+    def hash_text(text):
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
     @staticmethod
-    def get_embeddings(text):
+    def file_fingerprint(path):
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                digest.update(block)
+
+        return digest.hexdigest()
+
+    def source_fingerprint(self):
+        # Combined over every source, in order, so adding or reordering PDFs also triggers a build
+        return self.hash_text("|".join(f"{path}:{self.file_fingerprint(path)}" for path in self.source_paths))
+
+    def load_manifest(self):
+        # Manifest of the handbook index: the active version (the pointer queries
+        # follow), the versions still on disk, the fingerprint of the ingested
+        # sources and a content_hash -> id map of every chunk in the active version.
+        empty = {"schema": SCHEMA_VERSION, "version": None, "versions": [], "source_hash": None, "chunks": {}}
+        if not os.path.exists(self.manifest_path):
+            return empty
+
+        with open(self.manifest_path) as file:
+            manifest = json.load(file)
+
+        if manifest.get("schema") != SCHEMA_VERSION:
+            return empty
 
-        model = 'models/embedding-001'
-        embedding = genai.embed_content(model=model,
-                                        content=text,
-                                        task_type="retrieval_document")
+        return manifest
 
-        return embedding['embedding']
+    def save_manifest(self, manifest):
+
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(manifest, file)
+        os.replace(tmp_path, self.manifest_path)
+
+    @staticmethod
+    def split_sections(text, section):
+        # Splits a page into (section, start, end) segments at heading lines,
+        # the section open at the end of the previous page carries over.
+        segments = []
+        segment_start = position = 0
+        for line in text.splitlines(keepends=True):
+            match = HEADING_PATTERN.match(line)
+            if match:
+                if position > segment_start:
+                    segments.append((section, segment_start, position))
+                # NFKC folds the PDF's ligatures and non-breaking spaces, so filters can use plain text
+                section = " ".join(unicodedata.normalize("NFKC", match.group(1)).split())
+                segment_start = position
+            position += len(line)
+
+        segments.append((section, segment_start, len(text)))
+        return segments
+
+    def iter_chunks(self):
+        """Chunks of every source in order, produced page by page."""
+
+        for source_path in self.source_paths:
+            yield from self.chunkize_source(source_path)
 
     def read_and_chunkize_text(self):
+        return list(self.iter_chunks())
 
-        pages = self.loader.load_and_split()
-        text = "\n".join([doc.page_content for doc in pages])
+    def chunkize_source(self, source_path):
+        # The PDF and splitter stack is only imported when something is actually ingested
+        from langchain_community.document_loaders import PyPDFLoader
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+        source = os.path.basename(source_path)
 
         text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=500,
             chunk_overlap=150,
             length_function=len,
             is_separator_regex=False,
+            add_start_index=True,
         )
-        docs = text_splitter.create_documents([text])
-        for i, d in enumerate(docs):
-            d.metadata = {"doc_id": i}
 
-        return docs
+        section = ""
+        page_offset = 0  # offset of the page in the newline-joined document text
+        # lazy_load parses one page at a time, the whole PDF is never held in memory
+        for page_number, page in enumerate(PyPDFLoader(source_path).lazy_load()):
+            text = page.page_content
+            page_number = page.metadata.get("page", page_number) + 1
+
+            segments = self.split_sections(text, section)
+            for section, start, end in segments:
+                if not text[start:end].strip():
+                    continue
+                for chunk in text_splitter.create_documents([text[start:end]]):
+                    start_offset = page_offset + start + chunk.metadata["start_index"]
+                    chunk.metadata = {
+                        "source": source,
+                        "page": page_number,
+                        "section": section,
+                        "start_offset": start_offset,
+                        "end_offset": start_offset + len(chunk.page_content),
+                        "content_hash": self.hash_text(f"{source}|{page_number}|{section}|{chunk.page_content}"),
+                    }
+                    yield chunk
+
+            page_offset += len(text) + 1
 
-    def create_embedding_df(self):
+    @staticmethod
+    def chunk_row(doc, doc_id):
+        return dict(doc.metadata, id=doc_id, page_content=doc.page_content)
 
-        docs = self.read_and_chunkize_text()
+    def insert_batch(self, store, keyword_index, rows, resume_after):
+        # Rows up to `resume_after` were stored by an earlier, interrupted run of this
+        # build, they only need to go back into the keyword index
+        pending = [row for row in rows if row['id'] > resume_after]
+        if pending:
+            embeddings = np.asarray(self.embedder.embed([row['page_content'] for row in pending]), dtype=np.float32)
+            store.insert({name: [row[name] for row in pending] for name in COLUMNS}, embeddings)
+            print(f"Inserted ids {pending[0]['id']}-{pending[-1]['id']}.")
 
-        content_list = [doc.page_content for doc in docs]
-        embeddings = [self.get_embeddings(content) for content in content_list]
+        keyword_index.add([{name: row[name] for name in COLUMNS} for row in rows])
 
-        dataframe = pd.DataFrame({'page_content': content_list
-        , 'embeddings': embeddings})
+    @property
+    def checkpoint_path(self):
+        return os.path.splitext(self.manifest_path)[0] + "_build.json"
 
-        return dataframe
+    def load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_path):
+            return None
+        with open(self.checkpoint_path) as file:
+            return json.load(file)
 
-    def create_and_update_vectordb(self):
+    def save_checkpoint(self, checkpoint):
 
-        try:
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(checkpoint, file)
+        os.replace(tmp_path, self.checkpoint_path)
 
-            self.dbclient.command("""CREATE TABLE default.handbook (
-            id Int64, page_content String, embeddings Array(Float32),
-            CONSTRAINT check_data_length CHECK length(embeddings) = 768) 
-            ENGINE = MergeTree() ORDER BY id""")
+    def create_and_update_vectordb(self):
+        """Builds a new version from the sources and swaps it in, the active version serves queries meanwhile."""
 
-            dataframe = self.create_embedding_df()
+        with self.build_lock:
+            return self.build_version()
 
-            batch_size = 10
-            num_batches = len(dataframe) // batch_size
+    def build_version(self):
 
-            for i in range(num_batches):
-                start_idx = i * batch_size
-                end_idx = start_idx + batch_size
-                batch_data = dataframe[start_idx:end_idx]
-                # Insert the data
-                self.dbclient.insert("default.handbook", batch_data.to_records(index=False).tolist(), column_names=batch_data.columns.tolist())
-                print(f"Batch {i+1}/{num_batches} inserted.")
+        version = None
+        try:
 
-            # Create a vector index for a quick retrieval of data
-            self.dbclient.command("""
-            ALTER TABLE default.handbook
-                ADD VECTOR INDEX vector_index embeddings
-                TYPE MSTG
-            """)
+            source_hash = self.source_fingerprint()
+            manifest = self.load_manifest()
+
+            # Nothing changed since the last ingest, skip parsing and embedding
+            if manifest["source_hash"] == source_hash and manifest["version"] is not None:
+                if manifest["version"] != self.active_version:
+                    self.activate(manifest)
+                return "VECTORDB UP TO DATE"
+
+            old_version = manifest["version"]
+            old_index = self.keyword_index_for(old_version) if old_version is not None else None
+            stored = manifest["chunks"]
+            # A missing keyword index can only be rebuilt together with the store
+            fresh_build = not stored or not old_index
+            if fresh_build:
+                stored = {}
+
+            version = max(manifest["versions"], default=0) + 1
+            store = self.store_factory(version)
+
+            # A build of the same sources on top of the same version that failed part-way
+            # is resumed, anything else left behind by a failed build is dropped
+            checkpoint = self.load_checkpoint()
+            build = {"version": version, "base_version": old_version, "source_hash": source_hash}
+            resume = checkpoint is not None and all(checkpoint.get(key) == value for key, value in build.items())
+            if checkpoint is not None and not resume and checkpoint["version"] not in manifest["versions"]:
+                self.drop_version(checkpoint["version"])
+                store = self.store_factory(version)
+
+            if resume:
+                resume_after = store.max_id()
+                print(f"Resuming build of version {version} after id {resume_after}.")
+            else:
+                checkpoint = dict(build, copied=False)
+                store.create()
+                self.save_checkpoint(checkpoint)
+                resume_after = -1
+
+            keyword_index = self.keyword_index_for(version)
+            keyword_index.clear()
+
+            # Chunks stream from the splitter through the embedder into the store in
+            # batches of insert_batch_size, ids continue after the highest stored one
+            next_id = max(stored.values(), default=-1) + 1
+            chunks = {}
+            kept_ids = []
+            rows = []
+            for doc in self.iter_chunks():
+                content_hash = doc.metadata["content_hash"]
+                if content_hash in chunks:
+                    continue
+                if content_hash in stored:
+                    chunks[content_hash] = stored[content_hash]
+                    kept_ids.append(stored[content_hash])
+                    continue
+
+                chunks[content_hash] = next_id
+                rows.append(self.chunk_row(doc, next_id))
+                next_id += 1
+                if len(rows) == insert_batch_size:
+                    self.insert_batch(store, keyword_index, rows, resume_after)
+                    rows = []
+
+            if rows:
+                self.insert_batch(store, keyword_index, rows, resume_after)
+
+            added = len(chunks) - len(kept_ids)
+            stale_count = len(stored) - len(kept_ids)
+
+            # Unchanged chunks are copied over from the active version, only new ones are embedded
+            if kept_ids:
+                if not checkpoint["copied"]:
+                    store.copy_from(self.store_factory(old_version), kept_ids)
+                    store.flush()
+                    checkpoint["copied"] = True
+                    self.save_checkpoint(checkpoint)
+                keyword_index.add([old_index.rows[doc_id] for doc_id in kept_ids])
+
+            # The new version is complete, vector index built, before anything points at it
+            store.build_index()
+            store.flush()
+            keyword_index.save()
+
+            new_manifest = {"schema": SCHEMA_VERSION, "version": version, "versions": manifest["versions"] + [version],
+                            "source_hash": source_hash, "sources": self.source_paths, "chunks": chunks}
+
+            # The swap: one atomic manifest rename for other processes, then this one
+            self.save_manifest(new_manifest)
+            os.remove(self.checkpoint_path)
+            self.activate(new_manifest, keyword_index)
+            self.collect_garbage(new_manifest)
 
         except Exception as e:
+            # The half-built version and its checkpoint are kept, the next run resumes it
             return f"Error in Creating VectorDB :: {e}"
 
-        return "VECTORDB CREATED SUCCESFULLY"
+        if fresh_build:
+            return f"VECTORDB CREATED SUCCESFULLY :: version {version}"
 
-    def get_relevant_docs(self, user_query):
+        return f"VECTORDB UPDATED :: version {version}, {added} added, {stale_count} removed"
 
-        query_embeddings = self.get_embeddings(user_query)
+    def drop_version(self, version):
 
-        results = self.dbclient.query(f"""
-            SELECT page_content,
-            distance(embeddings, {query_embeddings}) as dist FROM default.handbook ORDER BY dist LIMIT 3
-        """)
-
-        relevant_docs = []
-        for row in results.named_results():
-            relevant_docs.append(row['page_content'])
+        try:
+            self.store_factory(version).drop()
+        finally:
+            self.store_release(version)
+            index = self.keyword_index_for(version)
+            if index.path is not None and os.path.exists(index.path):
+                os.remove(index.path)
+
+    def collect_garbage(self, manifest):
+        # The previous version stays for queries still in flight on it, older ones are dropped
+        versions = manifest["versions"]
+        if len(versions) <= keep_versions:
+            return
+
+        expired, manifest["versions"] = versions[:-keep_versions], versions[-keep_versions:]
+        self.save_manifest(manifest)
+        for version in expired:
+            try:
+                self.drop_version(version)
+            except Exception as e:
+                print(f"Error in Dropping Handbook Version {version} :: {e}")
+
+    def keyword_only(self, user_query, keyword_hits):
+        # An exact-term query is answered from the inverted index alone when the
+        # best hit contains every query term and clearly beats the runner-up
+        if not keyword_hits or not self.keyword_index.covers(user_query, keyword_hits[0][1]):
+            return False
+        if len(keyword_hits) == 1:
+            return True
+        return keyword_hits[0][0] >= keyword_only_margin * keyword_hits[1][0]
+
+    def fuse(self, vector_hits, keyword_hits, k):
+        return reciprocal_rank_fusion([vector_hits, [row for _, row in keyword_hits]], k, rrf_k=rrf_k)
+
+    def ready(self):
+        # Serves the active version, only the very first build is waited for
+        self.refresh()
+        if self.active_version is None:
+            self.retry_failed_ingest()
+            self.wait_for_ingest()
+        return self.active_version is not None
+
+    def get_relevant_docs(self, user_query, k=3, filters=None, with_metadata=False, mode=None):
+        """Top-k chunks for a query, optionally restricted by filters such as
+        {"section": "Leave Policy"}, {"page": 2} or {"source": "<pdf file name>"}
+        before ranking.
+
+        mode "hybrid" fuses BM25 and vector rankings with reciprocal-rank
+        fusion, "vector" uses the vector store only. Returns the page
+        contents, or with_metadata=True the full rows (page, section,
+        offsets) for citations.
+        """
+
+        mode = mode or retrieval_mode
+        scope = (k, tuple(sorted((filters or {}).items())), mode)
+
+        with span("retrieval", mode=mode, k=k, filters=filters) as retrieval:
+
+            if not self.ready():
+                retrieval.set(source="empty")
+                return []
+
+            cached = self.query_cache.get(user_query, self.handbook_version, scope)
+            if cached is not None:
+                retrieval.set(source="cache")
+                return self.format_docs(cached[1], with_metadata)
+
+            keyword_hits = []
+            if mode == "hybrid":
+                # Sub-millisecond on the handbook, so it runs first and can skip the embedding call
+                with span("bm25.search") as keyword_search:
+                    keyword_hits = self.keyword_index.search(user_query, k=4 * k, filters=filters)
+                    keyword_search.set(hits=len(keyword_hits))
+                if self.keyword_only(user_query, keyword_hits):
+                    retrieval.set(source="keyword")
+                    return self.format_docs([row for _, row in keyword_hits[:k]], with_metadata)
+
+            query_embeddings = self.get_embeddings(user_query)
+
+            relevant_docs = self.query_cache.get_similar(query_embeddings, self.handbook_version, scope)
+            if relevant_docs is not None:
+                retrieval.set(source="semantic_cache")
+            else:
+                retrieval.set(source="store")
+                with span("db.search", backend=type(self.store).__name__) as db_search:
+                    if mode == "hybrid":
+                        vector_hits = self.store.search(query_embeddings, k=4 * k, filters=filters)
+                        relevant_docs = self.fuse(vector_hits, keyword_hits, k)
+                    else:
+                        relevant_docs = self.store.search(query_embeddings, k=k, filters=filters)
+                    db_search.set(rows=len(relevant_docs))
+
+            self.query_cache.put(user_query, query_embeddings, relevant_docs, self.handbook_version, scope)
+
+            return self.format_docs(relevant_docs, with_metadata)
+
+    def get_relevant_docs_batch(self, user_queries, k=3, filters=None, with_metadata=False, mode=None):
+        """Retrieve docs for many queries with one embedding call and one DB round trip."""
+
+        mode = mode or retrieval_mode
+        scope = (k, tuple(sorted((filters or {}).items())), mode)
+        depth = 4 * k if mode == "hybrid" else k
+
+        if not self.ready():
+            return [[] for _ in user_queries]
+
+        relevant_docs = [None] * len(user_queries)
+        missing = []
+        for i, user_query in enumerate(user_queries):
+            cached = self.query_cache.get(user_query, self.handbook_version, scope)
+            if cached is not None:
+                relevant_docs[i] = cached[1]
+            else:
+                missing.append(i)
+
+        if missing:
+            query_embeddings = self.embedder.embed([user_queries[i] for i in missing])
+            results = self.store.search_many(query_embeddings, k=depth, filters=filters)
+
+            for i, query_embedding, docs in zip(missing, query_embeddings, results):
+                if mode == "hybrid":
+                    docs = self.fuse(docs, self.keyword_index.search(user_queries[i], k=depth, filters=filters), k)
+                relevant_docs[i] = docs
+                self.query_cache.put(user_queries[i], query_embedding, docs, self.handbook_version, scope)
+
+        return [self.format_docs(docs, with_metadata) for docs in relevant_docs]
 
-        return relevant_docs
+    @staticmethod
+    def format_docs(rows, with_metadata):
+        if with_metadata:
+            return rows
+        return [row['page_content'] for row in rows]
 
 # vb = VectorDB()
 # response = vb.create_and_update_vectordb()
 # print(response)
-# df = vb.create_embedding_df()
-# print("embedding df\n", df.head())
 
 # print(vb.get_relevant_docs("Dress Code?"))
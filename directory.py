@@ -0,0 +1,51 @@
+import re
+import json
+import unicodedata
+
+
+def words(text):
+    return re.findall(r"\w+", unicodedata.normalize("NFKC", text).lower())
+
+
+class RecipientIndex:
+    """Company directory lookup for email recipients.
+
+    Every recipient has aliases ("hr", "human resources", ...) that are
+    matched as whole words, so "hr" no longer matches inside "three". When
+    several recipients are mentioned, the one addressed with "to" wins,
+    then the first mention ("email HR and cc my manager" goes to HR), and
+    at the same position the longest alias.
+    """
+
+    def __init__(self, path="directory.json"):
+        with open(path) as file:
+            directory = json.load(file)
+
+        self.default = directory["default"]
+        self.aliases = {}
+        for recipient in directory["recipients"]:
+            for alias in [recipient["name"], recipient["email"].split("@")[0]] + recipient.get("aliases", []):
+                self.aliases.setdefault(tuple(words(alias)), recipient)
+
+        self.max_alias_words = max((len(alias) for alias in self.aliases), default=0)
+
+    def matches(self, text):
+        # (recipient, position, alias length, addressed) for every alias occurring in text
+        tokens = words(text)
+        found = []
+        for start in range(len(tokens)):
+            for length in range(1, self.max_alias_words + 1):
+                recipient = self.aliases.get(tuple(tokens[start:start + length]))
+                if recipient is not None:
+                    addressed = "to" in tokens[max(start - 3, 0):start]
+                    found.append((recipient, start, length, addressed))
+        return found
+
+    def find(self, text):
+
+        found = self.matches(text)
+        if not found:
+            return self.default
+
+        recipient, *_ = max(found, key=lambda match: (match[3], -match[1], match[2]))
+        return recipient["email"]
@@ -0,0 +1,149 @@
+import time
+import random
+import threading
+import hashlib
+import math
+import configparser
+from concurrent.futures import ThreadPoolExecutor
+
+from google.api_core import exceptions as google_exceptions
+
+from resources import get_resource
+from tracing import span
+
+
+config = configparser.ConfigParser()
+config.read('config.INI')
+
+api_key = config.get('General', 'GEMINI_API_KEY', fallback=None)
+
+
+# Errors worth retrying: quota / rate limiting and transient server failures
+RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+)
+
+
+def get_genai():
+    # google.generativeai takes about a second to import, it is loaded and configured on first use
+    def configure():
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        return genai
+
+    return get_resource("genai", configure)
+
+
+class GeminiEmbeddingBackend:
+    """Embeds a list of texts with a single genai.embed_content request."""
+
+    def __init__(self, model='models/embedding-001', task_type="retrieval_document"):
+        self.model = model
+        self.task_type = task_type
+
+    def embed(self, texts):
+
+        embedding = get_genai().embed_content(model=self.model,
+                                        content=texts,
+                                        task_type=self.task_type)
+
+        return embedding['embedding']
+
+
+class FakeEmbeddingBackend:
+    """Deterministic offline stand-in for Gemini, used to benchmark ingestion.
+
+    Texts are embedded by hashing their words into `dim` buckets, so equal
+    texts always get equal vectors and similar texts get similar ones.
+    `latency` seconds are slept per request to mimic a network round trip.
+    """
+
+    def __init__(self, dim=768, latency=0.0):
+        self.dim = dim
+        self.latency = latency
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def embed_one(self, text):
+
+        vector = [0.0] * self.dim
+        for word in text.lower().split():
+            digest = hashlib.md5(word.encode("utf-8")).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed(self, texts):
+
+        with self._lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        return [self.embed_one(text) for text in texts]
+
+
+class Embedder:
+    """Batched, concurrent embedding client.
+
+    Texts are split into batches of `batch_size`, up to `max_workers` batches
+    are in flight at once, and rate-limited batches are retried with
+    exponential backoff. Output order always matches input order.
+    """
+
+    def __init__(self, backend=None, batch_size=100, max_workers=4,
+                 max_retries=5, backoff=1.0, max_backoff=30.0):
+        self.backend = backend if backend is not None else GeminiEmbeddingBackend()
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def embed_batch(self, batch):
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.backend.embed(batch)
+            except RETRYABLE_ERRORS:
+                if attempt == self.max_retries:
+                    raise
+                delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+                time.sleep(delay * random.uniform(0.5, 1.0))
+
+    def embed(self, texts):
+
+        texts = list(texts)
+        if not texts:
+            return []
+
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+
+        with span("embedding", texts=len(texts), batches=len(batches), chars=sum(map(len, texts))):
+            if len(batches) == 1:
+                return self.embed_batch(batches[0])
+
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as executor:
+                results = executor.map(self.embed_batch, batches)
+
+            return [vector for batch in results for vector in batch]
+
+
+if __name__ == "__main__":
+
+    # Offline throughput check: 1000 chunks against a 50ms fake backend
+    chunks = [f"policy chunk number {i} about leave and dress code" for i in range(1000)]
+    for batch_size, max_workers in [(1, 1), (100, 1), (100, 4)]:
+        backend = FakeEmbeddingBackend(latency=0.05)
+        embedder = Embedder(backend=backend, batch_size=batch_size, max_workers=max_workers)
+        start = time.perf_counter()
+        embedder.embed(chunks)
+        elapsed = time.perf_counter() - start
+        print(f"batch_size={batch_size} workers={max_workers}: {backend.requests} requests, "
+              f"{elapsed:.2f}s, {len(chunks) / elapsed:.0f} chunks/s")
@@ -0,0 +1,155 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from context import estimate_tokens
+
+
+summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="history-summary")
+
+SUMMARY_PROMPT = '''You are summarizing a conversation between an employee of Arjtech Pvt Ltd and
+its AI assistant. Write a short running summary that keeps names, dates, recipients,
+decisions and open requests, and drops drafts, minutes and policy text verbatim.
+Previous summary: {}
+Conversation to add: {}
+'''
+
+
+def part_text(part):
+
+    function_call = getattr(part, "function_call", None)
+    if function_call is not None and function_call.name:
+        return f"{function_call.name}({dict(function_call.args.items())})"
+
+    function_response = getattr(part, "function_response", None)
+    if function_response is not None and function_response.name:
+        return f"{function_response.name} -> {dict(function_response.response.items())}"
+
+    return part.text
+
+
+def content_text(content):
+    return " ".join(part_text(part) for part in content.parts)
+
+
+def split_turns(history):
+    # A turn starts with a user message that is not a function response
+    turns = []
+    for content in history:
+        starts_turn = content.role == "user" and not any(
+            getattr(part, "function_response", None) is not None and part.function_response.name
+            for part in content.parts
+        )
+        if starts_turn or not turns:
+            turns.append([])
+        turns[-1].append(content)
+    return turns
+
+
+class HistoryManager:
+    """Keeps the history sent with every chat message within a token budget.
+
+    The last `keep_turns` turns are sent verbatim. Older turns have their tool
+    results and long model answers collapsed to `stub_chars` stubs, and once
+    the prompt goes over `token_budget` they are rolled into a running
+    summary produced by `summary_model` on a background thread. A summary
+    is only requested once the stubbed turns alone reach `summary_tokens`
+    (a quarter of the budget by default), so a long recent turn does not
+    cost a summary call on every message. Until then, and until the summary
+    is ready, the oldest stubbed turns are dropped instead.
+    """
+
+    def __init__(self, summary_model=None, token_budget=4000, keep_turns=3, stub_chars=200, summary_tokens=None):
+        self.summary_model = summary_model
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.stub_chars = stub_chars
+        self.summary_tokens = summary_tokens if summary_tokens is not None else token_budget // 4
+
+        self.summary = ""
+        self.summarized_turns = 0
+        self.pending = None
+        # Reentrant: the summary callback runs inline when the future is already done
+        self.lock = threading.RLock()
+
+        self.prompt_sizes = []
+
+    def stub(self, text):
+        if len(text) <= self.stub_chars:
+            return text
+        return text[:self.stub_chars] + " ...[truncated]"
+
+    def stub_content(self, content):
+        from vertexai.generative_models import Content, Part
+
+        parts = []
+        for part in content.parts:
+            function_response = getattr(part, "function_response", None)
+            function_call = getattr(part, "function_call", None)
+            if function_response is not None and function_response.name:
+                response = {key: self.stub(str(value)) for key, value in function_response.response.items()}
+                parts.append(Part.from_function_response(name=function_response.name, response=response))
+            elif function_call is not None and function_call.name:
+                parts.append(part)
+            else:
+                parts.append(Part.from_text(self.stub(part.text)))
+
+        return Content(role=content.role, parts=parts)
+
+    def summarize(self, previous, turns):
+
+        conversation = "\n".join(f"{content.role}: {content_text(content)}" for turn in turns for content in turn)
+        prompt = SUMMARY_PROMPT.format(previous or "None", conversation)
+        return self.summary_model.generate_content(prompt).text
+
+    def finish_summary(self, future, summarized_turns):
+
+        with self.lock:
+            self.pending = None
+            try:
+                self.summary = future.result()
+                self.summarized_turns = summarized_turns
+            except Exception as e:
+                print(f"Conversation summary failed :: {e}")
+
+    def start_summary(self, turns, upto):
+
+        if self.summary_model is None or self.pending is not None:
+            return
+
+        self.pending = summary_executor.submit(self.summarize, self.summary, turns[self.summarized_turns:upto])
+        self.pending.add_done_callback(lambda future: self.finish_summary(future, upto))
+
+    def compact(self, history):
+        """Return the history to send with the next message."""
+
+        turns = split_turns(history)
+        split_at = max(len(turns) - self.keep_turns, 0)
+
+        with self.lock:
+            summary = self.summary
+            old = [[self.stub_content(content) for content in turn]
+                   for turn in turns[min(self.summarized_turns, split_at):split_at]]
+            recent = turns[split_at:]
+
+            prefix = []
+            if summary:
+                from vertexai.generative_models import Content, Part
+                prefix = [Content(role="user", parts=[Part.from_text(f"Summary of the earlier conversation: {summary}")]),
+                          Content(role="model", parts=[Part.from_text("Understood.")])]
+
+            size = self.size(prefix + [content for turn in old + recent for content in turn])
+            # Several turns go into one summary, not one call per turn over budget
+            if size > self.token_budget and self.size([content for turn in old for content in turn]) >= self.summary_tokens:
+                self.start_summary(turns, split_at)
+
+            # Until the summary catches up, drop the oldest stubbed turns to stay in budget
+            while old and size > self.token_budget:
+                size -= self.size(old.pop(0))
+
+        compacted = prefix + [content for turn in old + recent for content in turn]
+        self.prompt_sizes.append(size)
+        return compacted
+
+    @staticmethod
+    def size(history):
+        return sum(estimate_tokens(content_text(content)) for content in history)
@@ -1,93 +1,15 @@
 """
 web app chatbot Gemini function calling
 """
-import os
-from dotenv import load_dotenv
-import urllib
-import urllib.request
+import uuid
 import streamlit as st
-import pandas as pd
-import numpy as np
-from scipy.stats import linregress
-import matplotlib.pyplot as plt
 
-import vertexai
-from vertexai import generative_models
-from google.cloud import bigquery
-from vertexai.generative_models import (
-    FunctionDeclaration,
-    GenerativeModel,
-    GenerationConfig,
-    Tool,
-    Part,
-    SafetySetting
-)
-
-from toolbox import create_mom, write_an_email, answer_query
-
-
-#AUTHIENTICATION
-if "auth" not in st.session_state:
-    load_dotenv()
-    st.session_state.PROJECT_ID = os.getenv('PROJECT_ID')
-    st.session_state.LOCATION = os.getenv('LOCATION')
-    vertexai.init(project=st.session_state.PROJECT_ID , location=st.session_state.LOCATION)
-    st.session_state.bq_client = bigquery.Client(project=st.session_state.PROJECT_ID)
-    st.session_state.auth = True
+from agent import Agent
+from toolbox import get_artifact_store
 
-# Functions declaration
-create_mom_yaml = FunctionDeclaration(
-    name="create_mom",
-    description="This function processes spoken language descriptions of a meeting and organizes them into structured minutes, ensuring all important context is retained while irrelevant details are ignored.",
-    parameters={
-        "type": "object",
-        "properties": {
-            "description": {
-                "type": "string",
-                "description": "A text input containing the conversational description of the meeting, including discussions, decisions, and action items.",
-            }
-        },
-    },
-)
-
-
-write_an_email_yaml = FunctionDeclaration(
-    name="write_an_email",
-    description="This function generates a formal email template by taking information about the email content as input.",
-    parameters={
-        "type": "object",
-        "properties": {
-            
-            "about": {
-                "type": "string",
-                "description": "Text input specifying the content of the email.",
-            },
-        },
-    },
-)
-
-
-answer_query_yaml = FunctionDeclaration(
-    name="answer_query",
-    description="A function for retrieving documents and generating answers based on employee queries about company policies.",
-    parameters={
-        "type": "object",
-        "properties": {
-
-            "query": {
-                "type": "string",
-                "description": "the main topic on which an employee seeks clarification, which could include leave policies, dress codes, perks, and other relevant company policies.",
-            }
-        },
-    },
-)
-
-query_tools = Tool(
-    function_declarations=[create_mom_yaml,
-                        write_an_email_yaml,
-                        answer_query_yaml],
-)
 
+# Vertex AI and the Gemini clients are initialised by the agent on first use, once per
+# process, and the agent itself is cached process-wide with st.cache_resource.
 #WEB App Interface
 st.set_page_config(
     page_title="AI Agent - Employee Assistant",
@@ -159,61 +81,70 @@ with st.expander("Prepare MOMs", expanded=False):
 )
 
 #keep sessions
-if "messages" not in st.session_state:
-    st.session_state.messages = []
+# The agent holds every conversation, this script only renders one of them
+@st.cache_resource
+def get_agent():
+    return Agent()
 
-if 'gemini_history' not in st.session_state:
-    st.session_state.gemini_history = []
+agent = get_agent()
 
-st.session_state.model = GenerativeModel(
-                            model_name="gemini-1.0-pro-002",
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 
-                            system_instruction=["You are an AI Assistant developed for Arjtech. Your primary tasks are to write emails, retrieve information about company policies and assist in organizing meeting minutes using the provided tools."
-                            , "You will process spoken language descriptions to generate structured meeting summaries."
-                            , "Do not respond to questions outside these tasks.!"
-                            , "Please use the tools provided to give concise answers"
-                            , "DO NOT MAKEUP UP ANY ANSWERS IF NOT PROVIDED BY THE TOOLS!"],
-                            
-                            generation_config=GenerationConfig(temperature=0,
-                                                                top_p=0.95,
-                                                                top_k=10,
-                                                                candidate_count=1,
-                                                                max_output_tokens=8000,
-                                                                stop_sequences=["STOP!"]
-                            ),
-                            safety_settings=[SafetySetting(
-                                                category=generative_models.HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT,
-                                                threshold=generative_models.HarmBlockThreshold.BLOCK_LOW_AND_ABOVE
-                                            ),
-                                            SafetySetting(
-                                                category=generative_models.HarmCategory.HARM_CATEGORY_HATE_SPEECH,
-                                                threshold=generative_models.HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE
-                                            ),
-                                            SafetySetting(
-                                                category=generative_models.HarmCategory.HARM_CATEGORY_HARASSMENT,
-                                                threshold=generative_models.HarmBlockThreshold.BLOCK_LOW_AND_ABOVE
-                                            ),
-                                            SafetySetting(
-                                                category=generative_models.HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT,
-                                                threshold=generative_models.HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE
-                                            ),
-                            ],
-                            tools=[query_tools]
-)
+# Transcript of this session, kept by the agent; artifacts (minutes, emails) are stored per session too
+st.session_state.messages = agent.conversation(st.session_state.session_id).messages
 
-if 'chat' not in st.session_state:
-    st.session_state.chat = st.session_state.model.start_chat(response_validation=True,
-                                                            history=st.session_state.gemini_history)
 def reset_conversation():
-    del st.session_state.gemini_history
-    del st.session_state.chat
+    agent.reset(st.session_state.session_id)
+    del st.session_state.session_id
     del st.session_state.messages
 
 st.button(label='Reset', key='reset', on_click=reset_conversation)
 
-for message in st.session_state.messages:
+def stream_into(placeholder):
+    # Returns an on_text callback rendering the accumulated chunks into placeholder
+    chunks = []
+    def on_text(chunk):
+        chunks.append(chunk)
+        placeholder.markdown("".join(chunks).replace("$", "\\$") + "▌")  # noqa: W605
+    return on_text
+
+def render_events(message_placeholder):
+    # Renders the agent's turn events as they arrive
+    state = {"on_text": None, "on_tool_text": None}
+    def on_event(event):
+        kind = event["type"]
+        if kind == "model_start":
+            state["on_text"] = stream_into(message_placeholder)
+        elif kind == "text":
+            state["on_text"](event["text"])
+        elif kind == "tool_calls":
+            # Created here, on the script thread, the tool streams into it from its own thread
+            state["on_tool_text"] = stream_into(st.empty())
+        elif kind == "tool_text":
+            state["on_tool_text"](event["text"])
+        elif kind == "tool_result":
+            if event["message"] is not None and not event["streamed"]:
+                st.write(event["result"])
+        elif kind == "backend_details":
+            with message_placeholder.container():
+                st.markdown(event["details"])
+    return on_event
+
+def show_artifact(artifact, key):
+    # PDFs are written in the background, one still being rendered shows up on a later rerun
+    artifact_store = get_artifact_store()
+    if artifact_store.ready(artifact):
+        st.download_button(label=f"Download {artifact['name']}", data=artifact_store.read(artifact),
+                           file_name=artifact["name"], mime="application/pdf", key=key)
+    else:
+        st.caption(f"{artifact['name']} is being prepared.")
+
+for index, message in enumerate(st.session_state.messages):
     with st.chat_message(message["role"], avatar='🧑🏻' if message['role']=='user' else '🤖'):
         st.markdown(message["content"])  # noqa: W605
+        if message.get("artifact"):
+            show_artifact(message["artifact"], key=f"artifact-{index}")
         try:
             with st.expander("Function calls, parameters, and responses"):
                 st.markdown(message["backend_details"])
@@ -221,112 +152,18 @@ for message in st.session_state.messages:
             pass
 
 if prompt := st.chat_input(placeholder="Ask me about company policies, meeting minutes organization, or email writing assistance..."):
-    st.session_state.messages.append({"role": "user", "content": prompt})
     with st.chat_message("user", avatar='🧑🏻'):
         st.markdown(prompt)
 
     with st.chat_message("assistant", avatar='🤖'):
 
         message_placeholder = st.empty()
-        full_response = "" # pylint: disable=invalid-name
-        response = st.session_state.chat.send_message(prompt)
-        print(response)
-        response = response.candidates[0].content.parts[0]
-
-        backend_details = "" # pylint: disable=invalid-name
-        api_requests_and_responses  = []
-
-        function_calling_in_process = True # pylint: disable=invalid-name
-
-        while function_calling_in_process:
-            try:
-                params = {}
-                for key, value in response.function_call.args.items():
-                    params[key] = value
-
-                print(response.function_call.name)
-                print(params)
-
-                if response.function_call.name == "create_mom":
-                    result, api_response = create_mom(**params)
-                    st.write(result)
-                    api_requests_and_responses.append([response.function_call.name, params, api_response])
-                    st.session_state.messages.append(
-                        {
-                            "role": "assistant",
-                            "content": "notes",
-                            "notes": result,
-                        }
-                    )
-
-                if response.function_call.name == "write_an_email":
-                    email, api_response = write_an_email(**params) # pylint: disable=invalid-name
-                    api_requests_and_responses.append([response.function_call.name, params, api_response])
-                    st.write(email)
-                    st.session_state.messages.append(
-                        {
-                            "role": "assistant",
-                            "content": "email",
-                            "email": email,
-                        }
-                    )
-
-                if response.function_call.name == "answer_query":
-                    answer, api_response = answer_query(**params)
-                    api_requests_and_responses.append([response.function_call.name, params, api_response])
-
-                print(api_response)
-
-                response = st.session_state.chat.send_message(
-                    Part.from_function_response(
-                        name=response.function_call.name,
-                        response={
-                            "role": "assistant",
-                            "content": api_response,
-                        },
-                    ),
-                )
-
-                backend_details += "- Function call:\n"
-                backend_details += (
-                    "   - Function name: ```"
-                    + str(api_requests_and_responses[-1][0])
-                    + "```"
-                )
-                backend_details += "\n\n"
-                backend_details += (
-                    "   - Function parameters: ```"
-                    + str(api_requests_and_responses[-1][1])
-                    + "```"
-                )
-                backend_details += "\n\n"
-                backend_details += (
-                    "   - Function API response: ```"
-                    + str(api_requests_and_responses[-1][2])
-                    + "```"
-                )
-                backend_details += "\n\n"
-
-                with message_placeholder.container():
-                    st.markdown(backend_details)
-
-                response = response.candidates[0].content.parts[0]
-                print(f"function return: {api_response}, model_response: {response}")
-            except AttributeError:
-                function_calling_in_process = False # pylint: disable=invalid-name
-
-        st.session_state.gemini_history = st.session_state.chat.history
-        # st.markdown(response.text)
-        full_response = response.text
+        event = agent.run_turn(st.session_state.session_id, prompt, render_events(message_placeholder))
 
         with message_placeholder.container():
-            st.markdown(full_response.replace("$", "\\$"))  # noqa: W605
-            with st.expander("Function calls, parameters, and responses:"):
-                st.markdown(backend_details)
-
-        st.session_state.messages.append(
-            {
-                "role": "assistant",
-                "content": full_response,
-            }
-        )
\ No newline at end of file
+            if event["type"] == "error":
+                st.error(event["error"])
+            else:
+                st.markdown(event["message"]["content"].replace("$", "\\$"))  # noqa: W605
+                with st.expander("Function calls, parameters, and responses:"):
+                    st.markdown(event["message"]["backend_details"])
@@ -0,0 +1,94 @@
+import time
+import threading
+
+
+class ResourcePool:
+    """Process-wide pool of heavyweight clients shared by every session.
+
+    Each resource is built once by its factory on first use. When a health
+    check is given it is run at most every `check_interval` seconds, and a
+    resource that fails it (or raises) is closed and rebuilt.
+
+    The pool lock only guards the dict: factories and health checks run
+    outside it, so a factory may itself call `get` for another resource.
+    Builds of the same name are serialised by a per-name lock.
+    """
+
+    def __init__(self, check_interval=30.0):
+        self.check_interval = check_interval
+        self.resources = {}
+        self.build_locks = {}
+        self.lock = threading.Lock()
+
+    def get(self, name, factory, health_check=None):
+
+        with self.lock:
+            entry = self.resources.get(name)
+            stale = entry is not None and health_check is not None \
+                and time.monotonic() - entry["checked"] > self.check_interval
+            if entry is not None and not stale:
+                return entry["resource"]
+            if stale:
+                # Claimed by this caller, concurrent ones keep using the resource meanwhile
+                entry["checked"] = time.monotonic()
+            build_lock = self.build_locks.setdefault(name, threading.Lock())
+
+        if stale:
+            try:
+                healthy = health_check(entry["resource"])
+            except Exception:
+                healthy = False
+            if healthy:
+                return entry["resource"]
+            self.discard(name, entry)
+
+        with build_lock:
+            # Someone else may have built it while this caller waited
+            with self.lock:
+                entry = self.resources.get(name)
+            if entry is None:
+                entry = {"resource": factory(), "checked": time.monotonic()}
+                with self.lock:
+                    self.resources[name] = entry
+            return entry["resource"]
+
+    def put(self, name, resource):
+        # Registers a ready-made resource, e.g. an offline stand-in for benchmarks
+        with self.lock:
+            entry = self.resources.pop(name, None)
+            self.resources[name] = {"resource": resource, "checked": time.monotonic()}
+        self.close(entry)
+
+    def discard(self, name, entry=None):
+        # With `entry`, only that instance is dropped, not one rebuilt since
+        with self.lock:
+            if entry is not None and self.resources.get(name) is not entry:
+                return
+            entry = self.resources.pop(name, None)
+        self.close(entry)
+
+    def close(self, entry):
+
+        if entry is None:
+            return
+
+        close = getattr(entry["resource"], "close", None)
+        if close is not None:
+            try:
+                close()
+            except Exception:
+                pass
+
+    def clear(self):
+        with self.lock:
+            entries = list(self.resources.values())
+            self.resources.clear()
+        for entry in entries:
+            self.close(entry)
+
+
+pool = ResourcePool()
+
+
+def get_resource(name, factory, health_check=None):
+    return pool.get(name, factory, health_check)
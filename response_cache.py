@@ -0,0 +1,127 @@
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from concurrent.futures import Future
+
+
+class ResponseCache:
+    """Persistent prompt -> response cache for the tool generations.
+
+    Entries live in a SQLite table keyed on a hash of the model name, the
+    generation config, the handbook version (for RAG answers) and the
+    prompt. When the stored responses outgrow `max_bytes` the least recently
+    used ones are evicted. Concurrent calls for the same key share one
+    in-flight generation instead of each calling the model.
+    """
+
+    def __init__(self, path="response_cache.sqlite3", max_bytes=64 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+
+        self.lock = threading.Lock()
+        self.in_flight = {}
+
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+
+        self.connection = sqlite3.connect(path if path is not None else ":memory:", check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("""CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY, model TEXT, version TEXT, response TEXT,
+                size INTEGER, created REAL, accessed REAL)""")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    @staticmethod
+    def make_key(model, prompt, config=None, version=None):
+        config = json.dumps(config or {}, sort_keys=True, default=str)
+        return hashlib.sha256(f"{model}\x00{config}\x00{version}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    def get(self, key):
+
+        with self.lock, self.connection:
+            row = self.connection.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self.connection.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+
+        return row[0] if row is not None else None
+
+    def put(self, key, model, response, version=None):
+
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                    (key, model, version, response, size, now, now))
+            self.evict()
+
+    def evict(self):
+        # Called under the lock, drops least recently used entries until the size budget holds
+        total = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        for key, size in self.connection.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall():
+            self.connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def invalidate_versions(self, keep_version):
+        # Answers computed against an older handbook can never be hit again
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM responses WHERE version IS NOT NULL AND version != ?", (keep_version,))
+
+    def get_or_generate(self, model, prompt, generate, config=None, version=None):
+        """Return (response, source) where source is "hit", "coalesced" or "miss".
+
+        `generate()` is only called by the first of any concurrent callers
+        with the same key, the others wait for its result.
+        """
+
+        key = self.make_key(model, prompt, config, version)
+
+        response = self.get(key)
+        if response is not None:
+            with self.lock:
+                self.hits += 1
+            return response, "hit"
+
+        with self.lock:
+            future = self.in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self.in_flight[key] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result(), "coalesced"
+
+        try:
+            response = generate()
+            if version is not None:
+                self.invalidate_versions(version)
+            self.put(key, model, response, version)
+            future.set_result(response)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                self.in_flight.pop(key, None)
+
+        return response, "miss"
+
+    def stats(self):
+        with self.lock:
+            size, count = self.connection.execute("SELECT COALESCE(SUM(size), 0), COUNT(*) FROM responses").fetchone()
+            return {"entries": count, "bytes": size, "hits": self.hits,
+                    "coalesced": self.coalesced, "misses": self.misses}
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
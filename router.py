@@ -0,0 +1,139 @@
+import re
+import configparser
+
+import numpy as np
+
+from embedder import Embedder
+from resources import get_resource
+from tracing import span
+
+
+config = configparser.ConfigParser()
+config.read('config.INI')
+
+router_enabled = config.getboolean('Router', 'ENABLED', fallback=True)
+# Cosine similarity an embedding-only decision needs, and its lead over the runner-up
+router_threshold = config.getfloat('Router', 'THRESHOLD', fallback=0.8)
+router_margin = config.getfloat('Router', 'MARGIN', fallback=0.05)
+
+# Keyword patterns per tool, a request matching exactly one of them is a candidate for the fast path
+INTENT_PATTERNS = {
+    "write_an_email": re.compile(r"\b(e-?mails?|mail)\b", re.I),
+    "create_mom": re.compile(r"\b(minutes|mom|moms|meeting notes|meeting summary)\b", re.I),
+    "answer_query": re.compile(
+        r"\b(polic(y|ies)|leave|vacation|holidays?|dress code|attire|benefits?|perks?|insurance"
+        r"|working hours|wfh|work from home|remote(ly)?|reimbursements?|code of conduct|health and safety|safety"
+        r"|onboarding|new hires?|mentors?|training|401|retirement|payroll|paychecks?|salary"
+        r"|notice period|resign(ing|ation)?|exit interview|terminat(ed|ion)|transfer|team change"
+        r"|laptops?|gadgets?|home office|confidential|passwords?|encryption|data handling)\b", re.I),
+}
+
+# Requests that lean on the conversation ("make it shorter", "send that to HR") always go to the model
+FOLLOW_UP_PATTERN = re.compile(r"\b(it|that|this|these|those|again|above|previous|earlier|instead)\b", re.I)
+# So do requests with a second ask ("... and tell me the leave policy", "also ...", "..., what is the dress code?")
+SECOND_REQUEST_PATTERN = re.compile(
+    r"\b(also|as well)\b"
+    r"|\b(and|then)\s+(tell|explain|let me know|show|list|give|share|what|how|when|where|which|who|why|is|are|can|could|do|does)\b"
+    r"|[,.;!]\s*(what|how|when|where|which|who|why|is|are|can|could|do|does)\b[^,.;!]*\?", re.I)
+
+# Example requests per tool, embedded next to the tool description as the classifier's prototypes
+EXAMPLES = {
+    "write_an_email": [
+        "Draft an email to the manager asking for 2 days wfh in october",
+        "Write an email to HR asking for details about the health insurance plan",
+    ],
+    "create_mom": [
+        "Prepare the minutes of today's meeting where Alice shared design updates",
+        "Organise this meeting discussion into minutes with action items",
+    ],
+    "answer_query": [
+        "What is the policy regarding taking vacation or sick leave?",
+        "What are the main rules in our employee dress code?",
+    ],
+}
+
+PARAMS = {"write_an_email": "about", "create_mom": "description", "answer_query": "query"}
+
+
+class IntentRouter:
+    """Local intent classifier that lets obvious requests skip the planning call.
+
+    A request is routed when its keyword patterns point at exactly one tool
+    and the embedding classifier (cosine similarity to each tool's
+    description and examples) does not clearly prefer another one, or,
+    without a keyword hit, when the classifier alone is confident.
+    An email or minutes request whose subject is a policy ("email HR about
+    leave") goes to that tool. Multi-intent requests and follow-ups are
+    always left to the chat model.
+    """
+
+    def __init__(self, tools, embedder=None, threshold=router_threshold, margin=router_margin):
+        self.tools = tools
+        self._embedder = embedder
+        self.threshold = threshold
+        self.margin = margin
+        self.prototypes = None
+
+    @property
+    def embedder(self):
+        if self._embedder is not None:
+            return self._embedder
+        return get_resource("embedder", Embedder)
+
+    def build_prototypes(self):
+
+        names = [name for name in PARAMS if name in self.tools]
+        texts = [" ".join([self.tools[name].description] + EXAMPLES.get(name, [])) for name in names]
+        vectors = np.asarray(self.embedder.embed(texts), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+        self.prototypes = (names, vectors)
+
+    def classify(self, prompt):
+        # [(similarity, tool)] best first
+        if self.prototypes is None:
+            self.build_prototypes()
+
+        names, vectors = self.prototypes
+        query = np.asarray(self.embedder.embed([prompt])[0], dtype=np.float32)
+        similarities = vectors @ (query / (np.linalg.norm(query) + 1e-12))
+        return sorted(zip(similarities.tolist(), names), reverse=True)
+
+    def route(self, prompt):
+        """Returns (tool, params, reason) for a confidently classified request, else None."""
+
+        if not router_enabled or FOLLOW_UP_PATTERN.search(prompt) or SECOND_REQUEST_PATTERN.search(prompt):
+            return None
+
+        with span("router", prompt_chars=len(prompt)) as routing:
+            keyword_hits = [name for name, pattern in INTENT_PATTERNS.items()
+                            if name in self.tools and pattern.search(prompt)]
+            # Policy words after the email or minutes keyword are that request's subject
+            if len(keyword_hits) == 2 and "answer_query" in keyword_hits:
+                tool = keyword_hits[0]
+                if INTENT_PATTERNS[tool].search(prompt).start() < INTENT_PATTERNS["answer_query"].search(prompt).start():
+                    keyword_hits.remove("answer_query")
+            if len(keyword_hits) > 1:
+                routing.set(decision="model", keyword_hits=",".join(keyword_hits))
+                return None
+
+            ranked = self.classify(prompt)
+            scores = {name: score for score, name in ranked}
+            (best_score, best), (second_score, _) = ranked[0], ranked[1]
+            routing.set(best=best, similarity=round(best_score, 3), margin=round(best_score - second_score, 3))
+
+            if keyword_hits:
+                tool = keyword_hits[0]
+                # The classifier can only veto, by clearly preferring another tool
+                if best != tool and best_score - scores[tool] >= self.margin:
+                    routing.set(decision="model", keyword_hits=tool)
+                    return None
+                reason = f"keywords, embeddings {'agree' if best == tool else 'undecided'}"
+            elif best_score >= self.threshold and best_score - second_score >= self.margin:
+                tool = best
+                reason = f"embeddings, similarity {best_score:.2f}"
+            else:
+                routing.set(decision="model")
+                return None
+
+            routing.set(decision=tool)
+            return tool, {PARAMS[tool]: prompt}, reason
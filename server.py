@@ -0,0 +1,113 @@
+"""
+Local HTTP / WebSocket endpoint for the agent:
+
+    python server.py --host 127.0.0.1 --port 8080
+
+    POST   /chat                {"session_id", "prompt"} -> last event of the turn as JSON
+    POST   /chat/stream         same body -> every event of the turn, one JSON object per line
+    GET    /ws                  WebSocket, send {"session_id", "prompt"} messages, receive the events
+    DELETE /sessions/{id}       forget a conversation
+    GET    /health
+
+Event types are documented on agent.Agent. Conversations are held by the
+agent's session store, so running several workers behind a load balancer
+needs either sticky sessions or a shared store.
+"""
+import json
+import argparse
+
+from aiohttp import web, WSMsgType
+
+
+def dumps(data):
+    return json.dumps(data, default=str)
+
+
+async def read_turn(request):
+
+    try:
+        body = await request.json()
+        return body["session_id"], body["prompt"]
+    except (ValueError, KeyError, TypeError):
+        raise web.HTTPBadRequest(text='Expected a JSON body with "session_id" and "prompt"')
+
+
+async def chat(request):
+
+    session_id, prompt = await read_turn(request)
+    event = await request.app["agent"].chat(session_id, prompt)
+    return web.json_response(event, dumps=dumps)
+
+
+async def chat_stream(request):
+
+    session_id, prompt = await read_turn(request)
+
+    response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+    await response.prepare(request)
+    async for event in request.app["agent"].stream(session_id, prompt):
+        await response.write((dumps(event) + "\n").encode("utf-8"))
+    await response.write_eof()
+    return response
+
+
+async def websocket(request):
+
+    ws = web.WebSocketResponse()
+    await ws.prepare(request)
+
+    async for message in ws:
+        if message.type != WSMsgType.TEXT:
+            continue
+        try:
+            body = json.loads(message.data)
+            session_id, prompt = body["session_id"], body["prompt"]
+        except (ValueError, KeyError, TypeError):
+            await ws.send_str(dumps({"type": "error", "error": 'Expected "session_id" and "prompt"'}))
+            continue
+
+        async for event in request.app["agent"].stream(session_id, prompt):
+            await ws.send_str(dumps(event))
+
+    return ws
+
+
+async def reset(request):
+    request.app["agent"].reset(request.match_info["session_id"])
+    return web.json_response({"status": "ok"})
+
+
+async def health(request):
+    return web.json_response({"status": "ok"})
+
+
+def make_app(agent=None):
+
+    if agent is None:
+        from agent import Agent
+        agent = Agent()
+
+    app = web.Application()
+    app["agent"] = agent
+    app.add_routes([
+        web.post("/chat", chat),
+        web.post("/chat/stream", chat_stream),
+        web.get("/ws", websocket),
+        web.delete("/sessions/{session_id}", reset),
+        web.get("/health", health),
+    ])
+    return app
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+
+    web.run_app(make_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+import os
+import json
+import time
+import shutil
+
+import numpy as np
+
+
+# Every column stored next to `embeddings`, in table order
+COLUMNS = ['id', 'page_content', 'content_hash', 'source', 'page', 'section', 'start_offset', 'end_offset']
+
+# Columns get_relevant_docs can pre-filter on, with their ClickHouse types
+FILTER_COLUMNS = {'source': 'String', 'page': 'Int32', 'section': 'String'}
+
+# Query vectors, k and filter values are sent as bound parameters instead of
+# being formatted into the SQL text, so the statement shape never changes between queries.
+SEARCH_QUERY = """
+    SELECT {query_idx} AS query_idx, {columns},
+    distance(embeddings, {{q{query_idx}:Array(Float32)}}) as dist FROM {table} {where} ORDER BY dist LIMIT {{k:UInt32}}
+"""
+
+
+def check_filters(filters):
+
+    for column in filters or {}:
+        if column not in FILTER_COLUMNS:
+            raise ValueError(f"Unsupported filter column :: {column}")
+
+
+class MyScaleStore:
+    """Handbook chunks stored in a MyScale (ClickHouse) table with an MSTG vector index."""
+
+    def __init__(self, host='myscaledb', port='port', username=None, password=None, table="default.handbook",
+                 index_timeout=600.0, poll_interval=1.0):
+        import clickhouse_connect
+
+        self.table = table
+        self.index_timeout = index_timeout
+        self.poll_interval = poll_interval
+        self.search_statements = {}
+        self.client = clickhouse_connect.get_client(
+            host=host,
+            port=port,
+            username=username,
+            password=password
+            )
+
+    def create(self):
+
+        self.client.command(f"DROP TABLE IF EXISTS {self.table}")
+        self.client.command(f"""CREATE TABLE {self.table} (
+        id Int64, page_content String, content_hash String, source String,
+        page Int32, section String, start_offset Int64, end_offset Int64,
+        embeddings Array(Float32),
+        CONSTRAINT check_data_length CHECK length(embeddings) = 768)
+        ENGINE = MergeTree() ORDER BY id""")
+
+    def insert(self, columns, embeddings):
+        # Column-oriented insert, the embedding rows go over as float32 arrays without per-row conversion
+        data = [columns[name] for name in COLUMNS] + [list(np.asarray(embeddings, dtype=np.float32))]
+        self.client.insert(self.table, data, column_names=COLUMNS + ['embeddings'], column_oriented=True)
+
+    def max_id(self):
+        count, max_id = self.client.query(f"SELECT count(), max(id) FROM {self.table}").result_rows[0]
+        return max_id if count else -1
+
+    def copy_from(self, other, ids):
+        # Server-side copy of unchanged rows, nothing is re-embedded
+        self.client.command(f"""INSERT INTO {self.table} ({', '.join(COLUMNS)}, embeddings)
+        SELECT {', '.join(COLUMNS)}, embeddings FROM {other.table} WHERE id IN ({', '.join(map(str, ids))})""")
+
+    def drop(self):
+        self.client.command(f"DROP TABLE IF EXISTS {self.table}")
+
+    def index_status(self):
+        # (status, latest_failed_part, latest_fail_reason) of the table's vector index, None before it is added
+        database, _, table = self.table.rpartition(".")
+        rows = self.client.query(
+            "SELECT status, latest_failed_part, latest_fail_reason FROM system.vector_indices "
+            "WHERE database = {database:String} AND table = {table:String} AND name = 'vector_index'",
+            parameters={"database": database or "default", "table": table}).result_rows
+        return tuple(rows[0]) if rows else None
+
+    def build_index(self):
+
+        # An index that failed in an earlier, interrupted build is dropped and added again
+        status = self.index_status()
+        if status is not None and status[0] == 'Error':
+            self.client.command(f"ALTER TABLE {self.table} DROP VECTOR INDEX vector_index")
+            status = None
+
+        # Create a vector index for a quick retrieval of data
+        if status is None:
+            self.client.command(f"""
+            ALTER TABLE {self.table}
+                ADD VECTOR INDEX vector_index embeddings
+                TYPE MSTG
+            """)
+
+        # The ALTER only starts the build, MyScale finishes it in the background
+        deadline = time.monotonic() + self.index_timeout
+        while True:
+            status, failed_part, reason = self.index_status()
+            if status == 'Built':
+                return
+            if status == 'Error':
+                raise RuntimeError(f"Vector index build failed on part {failed_part} :: {reason}")
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Vector index of {self.table} not built within {self.index_timeout} seconds ({status})")
+            time.sleep(self.poll_interval)
+
+    def flush(self):
+        pass
+
+    def ping(self):
+        return self.client.ping()
+
+    def close(self):
+        self.client.close()
+
+    def search_statement(self, num_queries, filter_columns):
+
+        # One statement per batch size and filter set, built once and reused
+        key = (num_queries, filter_columns)
+        if key not in self.search_statements:
+            where = ""
+            if filter_columns:
+                where = "WHERE " + " AND ".join(
+                    f"{column} = {{f_{column}:{FILTER_COLUMNS[column]}}}" for column in filter_columns
+                )
+            self.search_statements[key] = " UNION ALL ".join(
+                f"({SEARCH_QUERY.format(query_idx=i, columns=', '.join(COLUMNS), table=self.table, where=where)})"
+                for i in range(num_queries)
+            )
+
+        return self.search_statements[key]
+
+    def search_many(self, query_embeddings, k=3, filters=None):
+        """Top-k chunks for every query vector, in a single round trip."""
+
+        if not len(query_embeddings):
+            return []
+
+        check_filters(filters)
+        filters = filters or {}
+
+        parameters = {f"q{i}": [float(v) for v in embedding] for i, embedding in enumerate(query_embeddings)}
+        parameters["k"] = k
+        parameters.update({f"f_{column}": value for column, value in filters.items()})
+
+        statement = self.search_statement(len(query_embeddings), tuple(sorted(filters)))
+        results = self.client.query(statement, parameters=parameters)
+
+        hits = [[] for _ in query_embeddings]
+        for row in sorted(results.named_results(), key=lambda row: (row['query_idx'], row['dist'])):
+            hits[row['query_idx']].append({column: row[column] for column in COLUMNS})
+
+        return hits
+
+    def search(self, query_embedding, k=3, filters=None):
+        return self.search_many([query_embedding], k, filters)[0]
+
+
+class LocalVectorStore:
+    """In-process store keeping every embedding in one contiguous float32 matrix.
+
+    When `path` is given the store is persisted there (`embeddings.npy` plus
+    `chunks.json`) and, with `mmap=True`, the matrix is memory-mapped back
+    instead of read into memory. Search is an exact L2 scan with
+    `argpartition` top-k, which for a few hundred chunks takes microseconds.
+    Filters select the candidate rows before any distance is computed.
+    """
+
+    def __init__(self, path=None, dim=768, mmap=False):
+        self.path = path
+        self.dim = dim
+        self.mmap = mmap
+
+        self.create()
+
+        if path is not None and os.path.exists(os.path.join(path, "chunks.json")):
+            self.load()
+
+    def load(self):
+
+        with open(os.path.join(self.path, "chunks.json")) as file:
+            self.columns = json.load(file)
+
+        self.matrix = np.load(os.path.join(self.path, "embeddings.npy"), mmap_mode='r' if self.mmap else None)
+        self.sq_norms = np.einsum('ij,ij->i', self.matrix, self.matrix)
+
+    def create(self):
+
+        self.columns = {name: [] for name in COLUMNS}
+        self.matrix = np.empty((0, self.dim), dtype=np.float32)
+        self.sq_norms = np.empty(0, dtype=np.float32)
+
+    def insert(self, columns, embeddings):
+
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim)
+
+        for name in COLUMNS:
+            self.columns[name].extend(columns[name])
+        self.matrix = np.ascontiguousarray(np.vstack([self.matrix, embeddings]))
+        self.sq_norms = np.concatenate([self.sq_norms, np.einsum('ij,ij->i', embeddings, embeddings)])
+
+    def max_id(self):
+        return max(self.columns['id'], default=-1)
+
+    def copy_from(self, other, ids):
+
+        ids = set(ids)
+        rows = [i for i, doc_id in enumerate(other.columns['id']) if doc_id in ids]
+        self.insert({name: [other.columns[name][i] for i in rows] for name in COLUMNS}, other.matrix[rows])
+
+    def drop(self):
+
+        self.create()
+        if self.path is not None:
+            shutil.rmtree(self.path, ignore_errors=True)
+
+    def build_index(self):
+        pass
+
+    def ping(self):
+        return True
+
+    def flush(self):
+
+        if self.path is None:
+            return
+
+        os.makedirs(self.path, exist_ok=True)
+        # Write to temp files and rename, a memory-mapped matrix may still point at the old file
+        matrix_path = os.path.join(self.path, "embeddings.npy")
+        with open(matrix_path + ".tmp", "wb") as file:
+            np.save(file, np.asarray(self.matrix, dtype=np.float32))
+        os.replace(matrix_path + ".tmp", matrix_path)
+
+        chunks_path = os.path.join(self.path, "chunks.json")
+        with open(chunks_path + ".tmp", "w") as file:
+            json.dump(self.columns, file)
+        os.replace(chunks_path + ".tmp", chunks_path)
+
+        if self.mmap:
+            self.load()
+
+    def candidates(self, filters):
+
+        if not filters:
+            return None
+
+        mask = np.ones(len(self.columns['id']), dtype=bool)
+        for column, value in filters.items():
+            mask &= np.asarray(self.columns[column]) == value
+
+        return np.flatnonzero(mask)
+
+    def search_many(self, query_embeddings, k=3, filters=None):
+        """Top-k chunks for every query vector with one matrix product."""
+
+        if not len(query_embeddings):
+            return []
+
+        check_filters(filters)
+        rows = self.candidates(filters)
+        matrix, sq_norms = self.matrix, self.sq_norms
+        if rows is not None:
+            matrix, sq_norms = matrix[rows], sq_norms[rows]
+
+        if not len(sq_norms):
+            return [[] for _ in query_embeddings]
+
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(-1, self.dim)
+        # ||x - q||^2 up to the constant ||q||^2, one row per query
+        dist = sq_norms[None, :] - 2.0 * (queries @ matrix.T)
+
+        k = min(k, dist.shape[1])
+        top = np.argpartition(dist, k - 1, axis=1)[:, :k]
+        order = np.argsort(np.take_along_axis(dist, top, axis=1), axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        if rows is not None:
+            top = rows[top]
+
+        return [[{name: self.columns[name][i] for name in COLUMNS} for i in row] for row in top]
+
+    def search(self, query_embedding, k=3, filters=None):
+        return self.search_many([query_embedding], k, filters)[0]
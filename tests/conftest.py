@@ -0,0 +1,4 @@
+import tracing
+
+# Spans stay in memory during tests, nothing is written to the working tree
+tracing.tracer.path = None
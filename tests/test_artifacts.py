@@ -0,0 +1,32 @@
+import io
+
+import pytest
+
+from artifacts import render_pdf
+
+pypdf = pytest.importorskip("pypdf")
+
+
+def pdf_text(pdf):
+    reader = pypdf.PdfReader(io.BytesIO(pdf))
+    return "\n".join(page.extract_text() for page in reader.pages)
+
+
+def test_accented_and_typographic_characters_survive():
+    text = "Meeting with Zoë Müller and José at the café – “ship it” • budget 5€ (approved)"
+
+    extracted = pdf_text(render_pdf(text, title="Minutes"))
+
+    assert "Minutes" in extracted
+    assert text in extracted
+
+
+def test_characters_outside_the_font_become_question_marks():
+    assert "Owner: ? (Tokyo office)" in pdf_text(render_pdf("Owner: 田 (Tokyo office)"))
+
+
+def test_long_text_is_wrapped_over_several_pages():
+    pdf = render_pdf("\n".join(f"action item {i}" for i in range(120)))
+
+    assert len(pypdf.PdfReader(io.BytesIO(pdf)).pages) == 3
+    assert "action item 119" in pdf_text(pdf)
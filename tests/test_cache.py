@@ -0,0 +1,28 @@
+from cache import QueryCache
+
+
+def test_every_lookup_is_a_hit_or_a_miss():
+    cache = QueryCache(maxsize=8, semantic_threshold=0.9)
+
+    assert cache.get("What is the leave policy?") is None
+    cache.put("What is the leave policy?", [1.0, 0.0], ["leave"])
+    assert cache.get("what is the LEAVE policy") == ([1.0, 0.0], ["leave"])
+
+    # Exact miss answered by the semantic tier
+    assert cache.get("How many leave days do I get?") is None
+    assert cache.get_similar([0.99, 0.05]) == ["leave"]
+
+    # Exact miss the semantic tier cannot answer either
+    assert cache.get("dress code") is None
+    assert cache.get_similar([0.0, 1.0]) is None
+
+    assert cache.stats() == {"size": 1, "hits": 1, "semantic_hits": 1, "misses": 3}
+
+
+def test_misses_are_counted_without_the_semantic_tier():
+    cache = QueryCache(maxsize=8)
+    for query in ["a", "b", "a"]:
+        if cache.get(query) is None:
+            cache.put(query, [1.0], [query])
+
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
@@ -0,0 +1,67 @@
+from context import assemble_context, dedupe, merge_rows, estimate_tokens
+
+
+DOCUMENT = "\n".join([
+    "Employees get twenty days of paid leave per year.",
+    "Unused leave can be carried over up to five days.",
+    "Sick leave needs a medical certificate after two days.",
+])
+
+
+def row(doc_id, start, end, source="handbook.pdf", text=DOCUMENT, page=1, section="Leave"):
+    return {"id": doc_id, "source": source, "page": page, "section": section,
+            "start_offset": start, "end_offset": end, "page_content": text[start:end]}
+
+
+def test_overlapping_chunks_merge_into_the_document_slice():
+    rows = [row(1, 30, 80), row(0, 0, 50), row(2, 70, 120)]
+
+    [passage] = merge_rows(rows)
+
+    assert passage["page_content"] == DOCUMENT[0:120]
+    assert (passage["start_offset"], passage["end_offset"]) == (0, 120)
+    assert passage["rank"] == 0 and sorted(passage["ids"]) == [0, 1, 2]
+
+
+def test_chunks_across_a_page_break_are_joined_with_the_newline():
+    first_end = DOCUMENT.index("\n")
+    rows = [row(0, 0, first_end), row(1, first_end + 1, first_end + 30)]
+
+    [passage] = merge_rows(rows)
+
+    assert passage["page_content"] == DOCUMENT[0:first_end + 30]
+
+
+def test_contained_chunk_does_not_repeat_text():
+    [passage] = merge_rows([row(0, 0, 100), row(1, 20, 60)])
+    assert passage["page_content"] == DOCUMENT[0:100]
+
+
+def test_separate_chunks_and_sources_stay_apart_in_rank_order():
+    rows = [row(0, 110, 150), row(1, 0, 40), row(2, 0, 40, source="other.pdf")]
+
+    passages = merge_rows(rows)
+
+    assert [passage["ids"] for passage in passages] == [[0], [1], [2]]
+    assert [passage["page_content"] for passage in passages] == [DOCUMENT[110:150], DOCUMENT[0:40], DOCUMENT[0:40]]
+
+
+def test_dedupe_keeps_the_best_ranked_copy():
+    passages = merge_rows([row(0, 0, 40), row(1, 0, 40, source="copy.pdf")])
+    assert [passage["source"] for passage in dedupe(passages)] == ["handbook.pdf"]
+
+
+def test_assemble_context_skips_passages_that_do_not_fit():
+    rows = [row(0, 0, 45), row(1, 52, 100), row(2, 120, 135)]
+    budget = estimate_tokens(DOCUMENT[0:45]) + estimate_tokens(DOCUMENT[120:135])
+
+    passages = assemble_context(rows, token_budget=budget)
+
+    # The second passage does not fit, the smaller third one still does
+    assert [passage["ids"] for passage in passages] == [[0], [2]]
+
+
+def test_assemble_context_truncates_an_oversized_best_passage():
+    passages = assemble_context([row(0, 0, len(DOCUMENT))], token_budget=5)
+
+    assert passages[0]["page_content"] == DOCUMENT[:20]
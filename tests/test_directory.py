@@ -0,0 +1,25 @@
+import os
+
+import pytest
+
+from directory import RecipientIndex
+
+
+@pytest.fixture
+def recipients():
+    return RecipientIndex(path=os.path.join(os.path.dirname(__file__), os.pardir, "directory.json"))
+
+
+def test_aliases_match_whole_words_only(recipients):
+    assert recipients.find("the three day offsite budget") == "xyz@arjtech.com"
+    assert recipients.find("asking HR for two days of leave") == "hr@arjtech.com"
+
+
+def test_first_mention_wins_over_a_longer_alias(recipients):
+    assert recipients.find("email HR and cc my manager") == "hr@arjtech.com"
+    assert recipients.find("email my manager and cc HR") == "manager@arjtech.com"
+
+
+def test_recipient_addressed_with_to_wins(recipients):
+    assert recipients.find("to my manager about the human resources survey") == "manager@arjtech.com"
+    assert recipients.find("about the supervisor training, send to the people team") == "hr@arjtech.com"
@@ -0,0 +1,175 @@
+import os
+import types
+
+import pytest
+
+import db
+from db import VectorDB
+from cache import QueryCache
+from embedder import Embedder, FakeEmbeddingBackend
+from store import LocalVectorStore
+
+
+class RecordingBackend(FakeEmbeddingBackend):
+    """Fake embeddings that records every embedded text and can fail after `fail_after` requests."""
+
+    def __init__(self):
+        super().__init__()
+        self.texts = []
+        self.fail_after = None
+
+    def embed(self, texts):
+        if self.fail_after is not None and self.requests >= self.fail_after:
+            raise RuntimeError("embedding service down")
+        self.texts.extend(texts)
+        return super().embed(texts)
+
+
+class LineVectorDB(VectorDB):
+    # One chunk per non-empty line of each text source, no PDF stack needed
+
+    def iter_chunks(self):
+        for source_path in self.source_paths:
+            source = os.path.basename(source_path)
+            offset = 0
+            with open(source_path) as file:
+                for line in file.read().split("\n"):
+                    if line.strip():
+                        yield types.SimpleNamespace(page_content=line, metadata={
+                            "source": source, "page": 1, "section": "",
+                            "start_offset": offset, "end_offset": offset + len(line),
+                            "content_hash": self.hash_text(f"{source}|{line}"),
+                        })
+                    offset += len(line) + 1
+
+
+@pytest.fixture
+def handbook(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "insert_batch_size", 2)
+
+    source = tmp_path / "handbook.txt"
+    source.write_text("\n".join(f"policy line {i} about leave" for i in range(5)))
+
+    backend = RecordingBackend()
+    stores = {}
+
+    def store_factory(version):
+        if version not in stores:
+            stores[version] = LocalVectorStore(path=str(tmp_path / "store" / f"v{version}"))
+        return stores[version]
+
+    def make():
+        return LineVectorDB(source_paths=[str(source)],
+                            manifest_path=str(tmp_path / "manifest.json"),
+                            embedder=Embedder(backend=backend, batch_size=100, max_workers=1),
+                            query_cache=QueryCache(maxsize=0),
+                            store_factory=store_factory,
+                            store_release=lambda version: stores.pop(version, None),
+                            keyword_index_path=str(tmp_path / "bm25.json"))
+
+    return types.SimpleNamespace(make=make, source=source, backend=backend, stores=stores, tmp_path=tmp_path)
+
+
+def stored_ids(store):
+    return sorted(store.columns['id'])
+
+
+def test_fresh_build_and_unchanged_rebuild(handbook):
+    vectordb = handbook.make()
+
+    assert vectordb.create_and_update_vectordb() == "VECTORDB CREATED SUCCESFULLY :: version 1"
+    assert vectordb.active_version == 1
+    assert stored_ids(vectordb.store) == [0, 1, 2, 3, 4]
+    assert len(handbook.backend.texts) == 5
+
+    assert handbook.make().create_and_update_vectordb() == "VECTORDB UP TO DATE"
+    assert len(handbook.backend.texts) == 5
+
+
+def test_update_copies_unchanged_chunks(handbook):
+    vectordb = handbook.make()
+    vectordb.create_and_update_vectordb()
+
+    lines = handbook.source.read_text().split("\n")
+    lines[1] = "a rewritten line about holidays"
+    handbook.source.write_text("\n".join(lines + ["a new line about insurance"]))
+
+    assert vectordb.create_and_update_vectordb() == "VECTORDB UPDATED :: version 2, 2 added, 1 removed"
+    # Only the two new lines were embedded again
+    assert handbook.backend.texts[5:] == ["a rewritten line about holidays", "a new line about insurance"]
+
+    store = vectordb.store
+    assert stored_ids(store) == [0, 2, 3, 4, 5, 6]
+    assert dict(zip(store.columns['id'], store.columns['page_content']))[2] == "policy line 2 about leave"
+    assert vectordb.keyword_index.search("insurance", k=1)[0][1]['id'] in (5, 6)
+
+
+def test_interrupted_build_resumes_without_reembedding(handbook):
+    vectordb = handbook.make()
+    # The first batch of two lands, the second fails
+    handbook.backend.fail_after = 1
+
+    status = vectordb.create_and_update_vectordb()
+    assert status.startswith("Error in Creating VectorDB")
+    assert os.path.exists(vectordb.checkpoint_path)
+    assert vectordb.active_version is None
+    assert stored_ids(handbook.stores[1]) == [0, 1]
+
+    handbook.backend.fail_after = None
+    assert vectordb.create_and_update_vectordb() == "VECTORDB CREATED SUCCESFULLY :: version 1"
+    assert not os.path.exists(vectordb.checkpoint_path)
+    assert stored_ids(vectordb.store) == [0, 1, 2, 3, 4]
+    # Every chunk was embedded exactly once across both runs
+    assert sorted(handbook.backend.texts) == sorted(set(handbook.backend.texts))
+    assert len(handbook.backend.texts) == 5
+    assert len(vectordb.keyword_index.rows) == 5
+
+
+def test_interrupted_build_of_other_sources_is_dropped(handbook):
+    vectordb = handbook.make()
+    handbook.backend.fail_after = 1
+    vectordb.create_and_update_vectordb()
+
+    handbook.backend.fail_after = None
+    handbook.source.write_text("entirely different text\nabout the dress code")
+
+    assert vectordb.create_and_update_vectordb() == "VECTORDB CREATED SUCCESFULLY :: version 1"
+    assert vectordb.store.columns["page_content"] == \
+        ["entirely different text", "about the dress code"]
+
+
+def test_old_versions_are_garbage_collected(handbook, monkeypatch):
+    monkeypatch.setattr(db, "keep_versions", 2)
+    vectordb = handbook.make()
+    vectordb.create_and_update_vectordb()
+
+    for i in range(2):
+        handbook.source.write_text(handbook.source.read_text() + f"\nupdate {i} to the leave policy")
+        vectordb.create_and_update_vectordb()
+
+    manifest = vectordb.load_manifest()
+    assert manifest["version"] == 3
+    assert manifest["versions"] == [2, 3]
+    assert 1 not in handbook.stores
+    assert not os.path.exists(handbook.tmp_path / "store" / "v1")
+    assert not os.path.exists(handbook.tmp_path / "bm25_v1.json")
+    assert os.path.exists(handbook.tmp_path / "bm25_v2.json")
+
+
+def test_failed_background_build_is_logged_and_retried(handbook, monkeypatch, capsys):
+    vectordb = handbook.make()
+    handbook.backend.fail_after = 0
+
+    vectordb.start_background_ingest()
+    assert not vectordb.ready()
+    assert "Error in Creating VectorDB :: embedding service down" in capsys.readouterr().out
+
+    # Not retried before the retry interval has passed
+    handbook.backend.fail_after = None
+    monkeypatch.setattr(db, "ingest_retry_interval", 3600)
+    assert not vectordb.ready()
+
+    monkeypatch.setattr(db, "ingest_retry_interval", 0)
+    assert vectordb.ready()
+    assert vectordb.active_version == 1
+    assert "VECTORDB CREATED SUCCESFULLY :: version 1" in capsys.readouterr().out
@@ -0,0 +1,96 @@
+import threading
+
+from resources import ResourcePool
+
+
+def test_factory_can_get_another_resource():
+    pool = ResourcePool()
+
+    def make_outer():
+        return ("outer", pool.get("inner", lambda: "inner"))
+
+    assert pool.get("outer", make_outer) == ("outer", "inner")
+    assert pool.get("inner", lambda: "rebuilt") == "inner"
+
+
+def test_nested_get_from_another_thread():
+    # A factory waiting on a worker that uses the pool must not hold the pool lock
+    pool = ResourcePool()
+
+    def make_outer():
+        result = []
+        worker = threading.Thread(target=lambda: result.append(pool.get("inner", lambda: "inner")))
+        worker.start()
+        worker.join(timeout=5)
+        return result
+
+    assert pool.get("outer", make_outer) == ["inner"]
+
+
+def test_concurrent_gets_build_once():
+    pool = ResourcePool()
+    started = threading.Event()
+    release = threading.Event()
+    builds = []
+
+    def factory():
+        builds.append(1)
+        started.set()
+        release.wait(timeout=5)
+        return object()
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(pool.get("slow", factory))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    started.wait(timeout=5)
+
+    # Other names are served while "slow" is being built
+    assert pool.get("fast", lambda: "fast") == "fast"
+
+    release.set()
+    for thread in threads:
+        thread.join(timeout=5)
+    assert len(builds) == 1
+    assert len(results) == 4 and all(result is results[0] for result in results)
+
+
+def test_unhealthy_resource_is_closed_and_rebuilt():
+    pool = ResourcePool(check_interval=0)
+    closed = []
+
+    class Client:
+        def __init__(self, healthy):
+            self.healthy = healthy
+
+        def close(self):
+            closed.append(self)
+
+    first = pool.get("client", lambda: Client(healthy=False))
+    second = pool.get("client", lambda: Client(healthy=True), health_check=lambda client: client.healthy)
+
+    assert second is not first and closed == [first]
+    assert pool.get("client", lambda: Client(healthy=True), health_check=lambda client: client.healthy) is second
+
+
+def test_health_check_runs_outside_the_pool_lock():
+    pool = ResourcePool(check_interval=60)
+    pool.put("store", "store")
+    pool.resources["store"]["checked"] = float("-inf")
+    checking = threading.Event()
+    release = threading.Event()
+
+    def ping(resource):
+        checking.set()
+        release.wait(timeout=5)
+        return True
+
+    checker = threading.Thread(target=lambda: pool.get("store", lambda: "new", health_check=ping))
+    checker.start()
+    checking.wait(timeout=5)
+
+    assert pool.get("store", lambda: "new", health_check=ping) == "store"
+    assert pool.get("other", lambda: "other") == "other"
+
+    release.set()
+    checker.join(timeout=5)
@@ -0,0 +1,106 @@
+import time
+import threading
+import itertools
+
+import pytest
+
+import response_cache
+from response_cache import ResponseCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Strictly increasing timestamps, so LRU order never depends on timer resolution
+    ticks = itertools.count(1)
+    monkeypatch.setattr(response_cache.time, "time", lambda: float(next(ticks)))
+
+
+def test_concurrent_identical_prompts_generate_once():
+    cache = ResponseCache(path=None)
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def generate():
+        calls.append(1)
+        started.set()
+        release.wait(timeout=5)
+        return "minutes"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(cache.get_or_generate("gemini-pro", "p", generate)))
+    leader.start()
+    started.wait(timeout=5)
+
+    followers = [threading.Thread(target=lambda: results.append(cache.get_or_generate("gemini-pro", "p", generate)))
+                 for _ in range(3)]
+    for follower in followers:
+        follower.start()
+    # The followers find the leader's generation in flight before it finishes
+    deadline = time.monotonic() + 5
+    while cache.stats()["coalesced"] < 3 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(timeout=5)
+
+    assert len(calls) == 1
+    assert sorted(results) == [("minutes", "coalesced")] * 3 + [("minutes", "miss")]
+    assert cache.get_or_generate("gemini-pro", "p", generate) == ("minutes", "hit")
+    assert cache.stats()["misses"] == 1 and cache.stats()["hits"] == 1
+
+
+def test_failed_generation_reaches_every_waiter_and_is_not_cached():
+    cache = ResponseCache(path=None)
+
+    def generate():
+        raise RuntimeError("quota exceeded")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_generate("gemini-pro", "p", generate)
+
+    assert cache.stats()["entries"] == 0
+    assert cache.get_or_generate("gemini-pro", "p", lambda: "ok") == ("ok", "miss")
+
+
+def test_least_recently_used_entries_are_evicted(clock):
+    cache = ResponseCache(path=None, max_bytes=10)
+
+    cache.get_or_generate("m", "a", lambda: "aaaa")
+    cache.get_or_generate("m", "b", lambda: "bbbb")
+    # Reading "a" makes "b" the least recently used
+    assert cache.get_or_generate("m", "a", lambda: "new")[1] == "hit"
+    cache.get_or_generate("m", "c", lambda: "cccc")
+
+    assert cache.stats()["bytes"] <= 10
+    assert cache.get(cache.make_key("m", "a")) == "aaaa"
+    assert cache.get(cache.make_key("m", "b")) is None
+    assert cache.get(cache.make_key("m", "c")) == "cccc"
+
+
+def test_answers_of_older_handbook_versions_are_invalidated():
+    cache = ResponseCache(path=None)
+
+    cache.get_or_generate("m", "leave?", lambda: "old answer", version="v1")
+    cache.get_or_generate("m", "minutes", lambda: "minutes")
+    cache.get_or_generate("m", "leave?", lambda: "new answer", version="v2")
+
+    assert cache.get(cache.make_key("m", "leave?", version="v1")) is None
+    assert cache.get(cache.make_key("m", "leave?", version="v2")) == "new answer"
+    # Entries without a version are not tied to the handbook
+    assert cache.get(cache.make_key("m", "minutes")) == "minutes"
+
+
+def test_key_covers_model_config_and_version():
+    keys = {ResponseCache.make_key("m", "p"), ResponseCache.make_key("other", "p"),
+            ResponseCache.make_key("m", "p", config={"temperature": 0}), ResponseCache.make_key("m", "p", version="v1")}
+    assert len(keys) == 4
+
+
+def test_responses_persist_across_instances(tmp_path):
+    path = str(tmp_path / "responses.sqlite3")
+    cache = ResponseCache(path=path)
+    cache.get_or_generate("m", "p", lambda: "stored")
+    cache.close()
+
+    assert ResponseCache(path=path).get_or_generate("m", "p", lambda: "regenerated") == ("stored", "hit")
@@ -0,0 +1,60 @@
+import sys
+import types
+
+import pytest
+
+from store import MyScaleStore
+
+
+class FakeClient:
+    """Answers system.vector_indices queries from a list of statuses, one per poll."""
+
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.commands = []
+
+    def command(self, statement):
+        self.commands.append(" ".join(statement.split()))
+
+    def query(self, statement, parameters=None):
+        assert parameters == {"database": "default", "table": "handbook_v2"}
+        status = self.statuses.pop(0) if len(self.statuses) > 1 else self.statuses[0]
+        return types.SimpleNamespace(result_rows=[] if status is None else [status])
+
+
+def make_store(monkeypatch, statuses, **kwargs):
+    client = FakeClient(statuses)
+    monkeypatch.setitem(sys.modules, "clickhouse_connect", types.SimpleNamespace(get_client=lambda **_: client))
+    return MyScaleStore(table="default.handbook_v2", poll_interval=0, **kwargs), client
+
+
+def test_build_index_waits_until_built(monkeypatch):
+    store, client = make_store(monkeypatch, [None, ("InProgress", "", ""), ("InProgress", "", ""), ("Built", "", "")])
+
+    store.build_index()
+
+    assert client.statuses == [("Built", "", "")]
+    assert [command.split(" ADD ")[1] for command in client.commands] == ["VECTOR INDEX vector_index embeddings TYPE MSTG"]
+
+
+def test_build_index_raises_on_a_failed_build(monkeypatch):
+    store, _ = make_store(monkeypatch, [None, ("Error", "all_1_1_0", "out of memory")])
+
+    with pytest.raises(RuntimeError, match="all_1_1_0 :: out of memory"):
+        store.build_index()
+
+
+def test_build_index_times_out(monkeypatch):
+    store, _ = make_store(monkeypatch, [("InProgress", "", "")], index_timeout=0)
+
+    with pytest.raises(TimeoutError):
+        store.build_index()
+
+
+def test_failed_index_of_an_earlier_build_is_rebuilt(monkeypatch):
+    store, client = make_store(monkeypatch, [("Error", "all_1_1_0", "killed"), ("Built", "", "")])
+
+    store.build_index()
+
+    assert client.commands[0] == "ALTER TABLE default.handbook_v2 DROP VECTOR INDEX vector_index"
+    assert "ADD VECTOR INDEX" in client.commands[1]
@@ -0,0 +1,36 @@
+import time
+import threading
+
+from toolbox import RegisteredTool
+
+
+def test_streamed_chunks_reach_the_calling_thread():
+
+    def echo(text: str, on_text=None):
+        for word in text.split():
+            on_text(word)
+        return text, "ok"
+
+    registered = RegisteredTool(echo, "Echoes its text", {}, timeout=5, max_concurrency=1)
+    seen = []
+    result = registered.run_untraced({"text": "a b c"}, lambda chunk: seen.append((chunk, threading.current_thread())))
+
+    assert result == ("a b c", "ok")
+    assert [chunk for chunk, _ in seen] == ["a", "b", "c"]
+    assert all(thread is threading.current_thread() for _, thread in seen)
+
+
+def test_streaming_tool_still_times_out():
+
+    def slow(on_text=None):
+        on_text("started")
+        time.sleep(1)
+        return None, "late"
+
+    registered = RegisteredTool(slow, "Sleeps", {}, timeout=0.2, max_concurrency=1)
+    seen = []
+    result = registered.run_untraced({}, seen.append)
+
+    assert seen == ["started"]
+    assert result == (None, "slow did not finish within 0.2 seconds.")
+    assert registered.stats()["timeouts"] == 1
@@ -0,0 +1,44 @@
+import json
+
+from tracing import Tracer
+
+
+def test_spans_are_buffered_and_written_on_flush(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer(path=str(path), flush_interval=60)
+
+    with tracer.span("turn", session_id="s") as turn:
+        with tracer.span("tool.answer_query"):
+            pass
+
+    assert not path.exists()
+    assert [span.name for span in tracer.trace(turn.trace_id)] == ["tool.answer_query", "turn"]
+
+    tracer.flush()
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [line["name"] for line in lines] == ["tool.answer_query", "turn"]
+    assert lines[0]["parent_span_id"] == lines[1]["span_id"]
+
+
+def test_full_file_is_rotated(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer(path=str(path), flush_interval=60, max_bytes=1)
+
+    for name in ["first", "second"]:
+        with tracer.span(name):
+            pass
+        tracer.flush()
+
+    assert json.loads(path.read_text())["name"] == "second"
+    assert json.loads((tmp_path / "traces.jsonl.1").read_text())["name"] == "first"
+
+
+def test_disabled_tracer_keeps_nothing(tmp_path):
+    tracer = Tracer(path=str(tmp_path / "traces.jsonl"), enabled=False)
+
+    with tracer.span("turn") as turn:
+        pass
+    tracer.flush()
+
+    assert tracer.trace(turn.trace_id) == []
+    assert not (tmp_path / "traces.jsonl").exists()
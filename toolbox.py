@@ -1,7 +1,17 @@
-from requests import get
-import google.generativeai as genai
-from langchain_community.document_loaders import PyPDFLoader
+import time
+import queue
+import inspect
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from db import VectorDB
+from embedder import get_genai
+from resources import get_resource
+from response_cache import ResponseCache
+from artifacts import ArtifactStore
+from context import assemble_context
+from directory import RecipientIndex
+from tracing import span, record_usage
 
 import configparser
 
@@ -10,27 +20,219 @@ config = configparser.ConfigParser()
 config.read('config.INI')
 
 # Accessing configuration values
-api_key = config.get('General', 'GEMINI_API_KEY')
+response_cache_enabled = config.getboolean('ResponseCache', 'ENABLED', fallback=True)
+response_cache_path = config.get('ResponseCache', 'PATH', fallback='response_cache.sqlite3')
+response_cache_max_mb = config.getfloat('ResponseCache', 'MAX_MB', fallback=64)
 
-# Configure and Initialise Gemini
-genai.configure(api_key=api_key)
-gemini = genai.GenerativeModel('gemini-pro')
+artifacts_root = config.get('Artifacts', 'ROOT', fallback='artifacts')
+directory_path = config.get('Directory', 'PATH', fallback='directory.json')
 
-vectordb = VectorDB()
-resp = vectordb.create_and_update_vectordb()
+# Chunks retrieved per policy question and the token budget of the passages they are packed into
+context_k = config.getint('Retrieval', 'CONTEXT_K', fallback=5)
+context_tokens = config.getint('Retrieval', 'CONTEXT_TOKENS', fallback=600)
+
+# Clients are created on first use, importing toolbox neither loads the Gemini SDK nor ingests
+def get_gemini():
+    return get_resource("gemini-pro", lambda: get_genai().GenerativeModel('gemini-pro'))
+
+def start_vectordb():
+    # Ingestion runs in the background, queries wait only for the very first build
+    vectordb = VectorDB()
+    vectordb.start_background_ingest()
+    return vectordb
+
+def get_vectordb():
+    return get_resource("vectordb", start_vectordb)
+
+# Streaming
+def stream_text(model, prompt, generation=None):
+    for chunk in model.generate_content(prompt, stream=True):
+        if generation is not None:
+            record_usage(generation, chunk)
+        yield chunk.text
+
+def get_response_cache():
+    return get_resource("response_cache", lambda: ResponseCache(
+        path=response_cache_path, max_bytes=int(response_cache_max_mb * 1024 * 1024)))
+
+def get_artifact_store():
+    return get_resource("artifacts", lambda: ArtifactStore(root=artifacts_root))
+
+def call_model(model, prompt, on_text, generation):
+
+    if on_text is None:
+        response = model.generate_content(prompt)
+        record_usage(generation, response)
+        return response.text
+
+    text = ""
+    for chunk in stream_text(model, prompt, generation):
+        text += chunk
+        on_text(chunk)
+    return text
+
+def generate_text(model, prompt, on_text=None, version=None):
+    # on_text, when given, is called with every partial chunk as it arrives.
+    # version ties the response to a handbook version, see ResponseCache.
+    with span("gemini.generate_content", prompt_chars=len(prompt), stream=on_text is not None) as generation:
+        if not response_cache_enabled:
+            text = call_model(model, prompt, on_text, generation)
+        else:
+            streamed = []
+
+            def generate():
+                streamed.append(True)
+                return call_model(model, prompt, on_text, generation)
+
+            text, source = get_response_cache().get_or_generate(
+                getattr(model, "model_name", type(model).__name__), prompt, generate,
+                config=getattr(model, "_generation_config", None), version=version)
+            generation.set(cache=source)
+            # Cached and coalesced responses arrive whole, they still go through the stream callback
+            if on_text is not None and not streamed:
+                on_text(text)
+
+        generation.set(response_chars=len(text))
+
+    return text
+
+# Tool registry
+# Declarations are generated from the function signatures once at import and
+# calls are dispatched by name, see `tool`.
+TOOLS = {}
+
+JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean"}
+
+tool_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="tool")
+
+class RegisteredTool:
+
+    def __init__(self, func, description, params, timeout, max_concurrency):
+        self.func = func
+        self.name = func.__name__
+        self.description = description
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.declaration = self.make_declaration(params)
+
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def make_declaration(self, params):
+
+        properties = {}
+        required = []
+        for name, parameter in inspect.signature(self.func).parameters.items():
+            if name == "on_text":
+                continue
+            properties[name] = {
+                "type": JSON_TYPES.get(parameter.annotation, "string"),
+                "description": params.get(name, ""),
+            }
+            if parameter.default is inspect.Parameter.empty:
+                required.append(name)
+
+        return {
+            "name": self.name,
+            "description": self.description,
+            "parameters": {"type": "object", "properties": properties, "required": required},
+        }
+
+    def call(self, params, on_text):
+        with self.slots:
+            return self.func(**params, on_text=on_text)
+
+    def run(self, params, on_text=None):
+        with span(f"tool.{self.name}", params_chars=len(str(params))) as tool_span:
+            result = self.run_untraced(params, on_text)
+            tool_span.set(response=str(result[1])[:200])
+            return result
+
+    def run_untraced(self, params, on_text=None):
+
+        start = time.perf_counter()
+        failed = timed_out = False
+        try:
+            if self.timeout is None:
+                return self.call(params, on_text)
+            context = contextvars.copy_context()
+            if on_text is None:
+                return tool_executor.submit(context.run, self.call, params, None).result(timeout=self.timeout)
+            return self.call_streaming(context, params, on_text)
+        except FutureTimeoutError:
+            failed = timed_out = True
+            return None, f"{self.name} did not finish within {self.timeout} seconds."
+        except Exception as e:
+            failed = True
+            return None, f"An error occurred while running {self.name} :: {e}"
+        finally:
+            latency = time.perf_counter() - start
+            with self.lock:
+                self.calls += 1
+                self.errors += failed
+                self.timeouts += timed_out
+                self.total_latency += latency
+                self.max_latency = max(self.max_latency, latency)
+
+    def call_streaming(self, context, params, on_text):
+        # The tool runs on the executor but its chunks are handed back to this thread,
+        # UI callbacks (Streamlit's script context) only work on the caller's thread
+        chunks = queue.Queue()
+        done = object()
+        future = tool_executor.submit(context.run, self.call, params, chunks.put)
+        future.add_done_callback(lambda _: chunks.put(done))
+
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                chunk = chunks.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                raise FutureTimeoutError()
+            if chunk is done:
+                return future.result()
+            on_text(chunk)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "calls": self.calls,
+                "errors": self.errors,
+                "timeouts": self.timeouts,
+                "mean_latency": self.total_latency / self.calls if self.calls else 0.0,
+                "max_latency": self.max_latency,
+            }
+
+def tool(description, params=None, timeout=None, max_concurrency=4):
+    # Registers the decorated function as a model tool, params maps argument names to descriptions
+    def register(func):
+        TOOLS[func.__name__] = RegisteredTool(func, description, params or {}, timeout, max_concurrency)
+        return func
+    return register
+
+def tool_declarations():
+    return [registered.declaration for registered in TOOLS.values()]
+
+def tool_stats():
+    return {name: registered.stats() for name, registered in TOOLS.items()}
 
 # Tools
 # Email Writer
-def find_receiver(text):
-    if "hr" in text.lower():
-        return "hr@arjtech.com"
+def get_recipient_index():
+    return get_resource("recipients", lambda: RecipientIndex(path=directory_path))
 
-    if "manager" in text.lower():
-        return "manager@arjtech.com"
-
-    return "xyz@arjtech.com"
+def find_receiver(text):
+    return get_recipient_index().find(text)
 
-def write_an_email(about):
+@tool(
+    description="This function generates a formal email template by taking information about the email content as input.",
+    params={"about": "Text input specifying the content of the email."},
+    timeout=120,
+)
+def write_an_email(about: str, on_text=None):
 
     try:
 
@@ -44,18 +246,20 @@ def write_an_email(about):
         Only use the information provided in the context, never hallucinate.
         '''.format(sender, receiver, about, length)
         
-        response = gemini.generate_content(prompt)
+        response = generate_text(get_gemini(), prompt, on_text)
+        get_artifact_store().save("email", response)
 
     except Exception as e:
         return None, f"An error occurred while formatting the email :: {e}"
 
-    return response.text, f"An email regarding this matter has been sent to the {receiver}. Please wait for their response."
+    return response, f"An email regarding this matter has been sent to the {receiver}. Please wait for their response."
 
 
 # Query Resolver
-def make_rag_prompt(query, relevant_passage):
+def make_rag_prompt(query, passages):
 
-    relevant_passage = ' '.join(relevant_passage)
+    # One paragraph per passage, the passages are already merged and deduplicated
+    relevant_passage = "\n\n".join(passage['page_content'] for passage in passages)
     prompt = (
         f"You are a helpful and informative chatbot at ArjTech Pvt Ltd that answers questions using text from the reference passage included below. "
         f"Respond in a complete sentence and make sure that your response is easy to understand for everyone. "
@@ -67,25 +271,36 @@ def make_rag_prompt(query, relevant_passage):
     )
     return prompt
 
-def generate_response(user_prompt):
-    model = genai.GenerativeModel('gemini-pro')
-    answer = model.generate_content(user_prompt)
-    return answer.text
+def generate_response(user_prompt, on_text=None, version=None):
+    answer = generate_text(get_gemini(), user_prompt, on_text, version)
+    return answer
 
-def answer_query(query):
+@tool(
+    description="A function for retrieving documents and generating answers based on employee queries about company policies.",
+    params={"query": "the main topic on which an employee seeks clarification, which could include leave policies, dress codes, perks, and other relevant company policies."},
+    timeout=120,
+)
+def answer_query(query: str, on_text=None):
 
-    relevant_text = vectordb.get_relevant_docs(query)
-    text = " ".join(relevant_text)
+    vectordb = get_vectordb()
+    rows = vectordb.get_relevant_docs(query, k=context_k, with_metadata=True)
+    passages = assemble_context(rows, token_budget=context_tokens)
 
-    prompt = make_rag_prompt(query, relevant_passage=text)
-    answer = generate_response(prompt)
+    prompt = make_rag_prompt(query, passages)
+    # Cached answers are dropped as soon as the handbook version changes
+    answer = generate_response(prompt, on_text, version=vectordb.handbook_version)
 
-    return answer, "True"
+    # The answer is also the function response, the chat model phrases its reply from it
+    return answer, answer
 
 # create a note
-def create_mom(description):
-
-    file_path="notes.pdf"
+@tool(
+    description="This function processes spoken language descriptions of a meeting and organizes them into structured minutes, ensuring all important context is retained while irrelevant details are ignored.",
+    params={"description": "A text input containing the conversational description of the meeting, including discussions, decisions, and action items."},
+    timeout=120,
+    max_concurrency=2,
+)
+def create_mom(description: str, on_text=None):
 
     prompt = '''You are a writing assistant at Arjtech Pvt Ltd, summarize the following meeting discussion 
     into organized minutes. Ensure to capture all important details 
@@ -94,9 +309,40 @@ def create_mom(description):
     Do not include any fabricated information. Here is the meeting description: {}
     '''.format(description)
 
-    response = gemini.generate_content(prompt)
+    response = generate_text(get_gemini(), prompt, on_text)
+
+    # Rendered to this session's folder on the writer thread, the reply doesn't wait for it
+    artifact = get_artifact_store().save("mom", response)
+
+    return response, f"File {artifact['name']} created successfully."
+
+
+# Tool executor
+def run_tool(name, params, on_text=None):
+
+    if name not in TOOLS:
+        return None, f"Unknown tool :: {name}"
+
+    return TOOLS[name].run(params, on_text)
+
+def run_tools(calls, max_workers=4):
+    # Runs every (name, params) call of a model turn concurrently, results keep the call order
+    if len(calls) == 1:
+        return [run_tool(*calls[0])]
+
+    # Each call runs in a copy of the caller's context so its spans stay in this turn's trace
+    contexts = [contextvars.copy_context() for _ in calls]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(calls))) as executor:
+        return list(executor.map(lambda context, call: context.run(run_tool, *call), contexts, calls))
 
-    with open(file_path, "w") as file:
-        file.write(response.text)
+def benchmark_tool(name, params, repeat=5):
+    # Times a tool in isolation, no Streamlit or chat model involved
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run_tool(name, params)
+        latencies.append(time.perf_counter() - start)
 
-    return response.text, f"File {file_path} created successfully."
+    latencies.sort()
+    return {"tool": name, "repeat": repeat, "min": latencies[0],
+            "median": latencies[len(latencies) // 2], "max": latencies[-1]}
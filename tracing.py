@@ -0,0 +1,179 @@
+import os
+import json
+import time
+import atexit
+import uuid
+import threading
+import contextvars
+import configparser
+from collections import deque
+from contextlib import contextmanager
+
+
+config = configparser.ConfigParser()
+config.read('config.INI')
+
+trace_path = config.get('Tracing', 'PATH', fallback='traces.jsonl')
+trace_enabled = config.getboolean('Tracing', 'ENABLED', fallback=True)
+# Buffered spans are appended to the file this often, off the request path
+trace_flush_interval = config.getfloat('Tracing', 'FLUSH_INTERVAL', fallback=1.0)
+# The file is rotated to <path>.1 once it reaches this size
+trace_max_mb = config.getfloat('Tracing', 'MAX_MB', fallback=50)
+
+current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+
+    def __init__(self, name, trace_id, parent_id, attributes):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = {key: value for key, value in attributes.items() if value is not None}
+        self.status = "OK"
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+
+    def set(self, **attributes):
+        self.attributes.update({key: value for key, value in attributes.items() if value is not None})
+
+    @property
+    def duration_ms(self):
+        end_ns = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end_ns - self.start_ns) / 1e6
+
+    def to_dict(self):
+        # Field names follow the OpenTelemetry span data model
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class Tracer:
+    """Records nested spans and exports every finished span as a JSONL line.
+
+    The active span is tracked in a context variable, so spans opened inside
+    a span become its children. Work submitted to thread pools must be run in
+    a copied context (contextvars.copy_context) to keep its parent. The most
+    recent `max_spans` spans are also kept in memory for per-turn breakdowns.
+    Finished spans are buffered and written by a background thread every
+    `flush_interval` seconds, with one backup kept when the file reaches
+    `max_bytes`.
+    """
+
+    def __init__(self, path=None, enabled=True, max_spans=10000, flush_interval=1.0, max_bytes=None):
+        self.path = path
+        self.enabled = enabled
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.spans = deque(maxlen=max_spans)
+        self.buffer = []
+        self.writer = None
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, **attributes):
+
+        parent = current_span.get()
+        span = Span(name, parent.trace_id if parent else uuid.uuid4().hex,
+                    parent.span_id if parent else None, attributes)
+        token = current_span.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.status = f"ERROR: {e}"
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            current_span.reset(token)
+            self.export(span)
+
+    def export(self, span):
+
+        if not self.enabled:
+            return
+
+        with self.lock:
+            self.spans.append(span)
+            if self.path is None:
+                return
+            self.buffer.append(span)
+            if self.writer is None:
+                self.writer = threading.Thread(target=self.write_loop, name="trace-writer", daemon=True)
+                self.writer.start()
+                atexit.register(self.flush)
+
+    def write_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error in Writing Traces :: {e}")
+
+    def flush(self):
+        # Every buffered span in one append
+        with self.lock:
+            spans, self.buffer = self.buffer, []
+        if not spans or self.path is None:
+            return
+
+        lines = "".join(json.dumps(span.to_dict(), default=str) + "\n" for span in spans)
+        with self.write_lock:
+            self.rotate()
+            with open(self.path, "a") as file:
+                file.write(lines)
+
+    def rotate(self):
+        if self.max_bytes is None:
+            return
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        if size >= self.max_bytes:
+            os.replace(self.path, self.path + ".1")
+
+    def trace(self, trace_id):
+        with self.lock:
+            return [span for span in self.spans if span.trace_id == trace_id]
+
+
+tracer = Tracer(path=trace_path, enabled=trace_enabled, flush_interval=trace_flush_interval,
+                max_bytes=int(trace_max_mb * 1024 * 1024) if trace_max_mb else None)
+
+
+def span(name, **attributes):
+    return tracer.span(name, **attributes)
+
+
+def record_usage(span, response):
+    # Token counts reported by Gemini, present on the last chunk of a stream
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        span.set(prompt_tokens=getattr(usage, "prompt_token_count", None),
+                 response_tokens=getattr(usage, "candidates_token_count", None))
+
+
+def breakdown_markdown(spans):
+    """Per-turn timing table for the function-call expander."""
+
+    depth = {}
+    lines = ["| span | ms | details |", "|---|---:|---|"]
+    for span in sorted(spans, key=lambda span: span.start_ns):
+        depth[span.span_id] = depth.get(span.parent_id, -1) + 1
+        details = ", ".join(f"{key}={value}" for key, value in span.attributes.items())
+        indent = "&nbsp;&nbsp;" * depth[span.span_id]
+        lines.append(f"| {indent}{span.name} | {span.duration_ms:.1f} | {details} |")
+
+    return "\n".join(lines)